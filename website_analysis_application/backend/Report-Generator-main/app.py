@@ -1,3 +1,5 @@
+import os
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -24,7 +26,8 @@ ascii_art = """
 app = FastAPI(
     title="AI Report Generator API App",
 )
-app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
+os.makedirs(settings.OUTPUTS_DIR, exist_ok=True)
+app.mount("/outputs", StaticFiles(directory=settings.OUTPUTS_DIR), name="outputs")
 
 # Add CORS middleware
 app.add_middleware(
@@ -35,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["Retry-After"],  # Read by the frontend when a job is rejected
 )
 
 logger.info(f"Starting App : \n {ascii_art}")
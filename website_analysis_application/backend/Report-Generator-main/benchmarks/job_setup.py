@@ -0,0 +1,75 @@
+"""
+Measures the per-job setup overhead of the crew: building the LLMs, binding the agent
+and task templates, and creating the single-task crews, for fresh and pooled LLMs.
+No LLM call is made.
+
+Usage, from the Report-Generator-main directory:
+    python -m benchmarks.job_setup [--jobs 50]
+"""
+
+import argparse
+import statistics
+import time
+
+from crewai import Crew
+from src.services.service_crewai.agents import create_agents
+from src.services.service_crewai.shared_context import build_shared_contexts
+from src.services.service_crewai.tasks import create_tasks
+from src.services.service_generator import REPORT_TYPES, RateLimitedLLM, get_llms
+
+URL = "https://example.com"
+
+
+def _fresh_llms() -> tuple:
+    return tuple(
+        RateLimitedLLM(model="chatgpt-4o-latest", temperature=0.7, api_key="sk-bench")
+        for _ in range(2)
+    )
+
+
+def _setup_job(build_llms) -> dict:
+    """
+    Sets up the crew of one job, returning the time of each step in milliseconds.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    llm, vision_llm = build_llms()
+    timings["llms"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    agents = create_agents(llm, vision_llm, build_shared_contexts(URL, {}, {}))
+    timings["agents"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    branches = create_tasks(agents, URL, REPORT_TYPES)
+    timings["tasks"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tasks = {id(task): task for tasks in branches.values() for task in tasks}
+    for task in tasks.values():
+        Crew(agents=[task.agent], tasks=[task], verbose=False)
+    timings["crews"] = time.perf_counter() - start
+
+    timings["total"] = sum(timings.values())
+    return {step: seconds * 1000 for step, seconds in timings.items()}
+
+
+def run(jobs: int):
+    for label, build_llms in (("fresh LLMs", _fresh_llms), ("pooled LLMs", get_llms)):
+        # The first job pays for the imports and the pool
+        _setup_job(build_llms)
+        samples = [_setup_job(build_llms) for _ in range(jobs)]
+        print(f"{label} ({jobs} jobs, ms per job):")
+        for step in samples[0]:
+            values = [sample[step] for sample in samples]
+            print(
+                f"  {step:<8} median {statistics.median(values):7.2f}"
+                f"  max {max(values):7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=50)
+    run(parser.parse_args().jobs)
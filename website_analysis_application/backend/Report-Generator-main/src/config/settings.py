@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings
 
@@ -16,6 +17,58 @@ class Settings(BaseSettings):
     JINA_AI_API_KEY: str
     PAGESPEED_INSIGHTS_API_KEY: str
 
+    # Shared state, so several uvicorn workers / replicas can serve the same jobs
+    STATE_BACKEND: str = "sqlite"  # "sqlite" or "redis"
+    STATE_SQLITE_PATH: str = "state/state.db"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    OUTPUTS_DIR: str = "outputs"
+    # Lets the front proxy send downloads with sendfile(2): "X-Accel-Redirect" (nginx,
+    # with an internal location aliasing OUTPUTS_DIR at DOWNLOAD_OFFLOAD_PREFIX) or
+    # "X-Sendfile" (Apache, lighttpd). Unset, the application streams the files itself.
+    # Offloaded, ETag/Last-Modified and conditional requests are left to the proxy.
+    DOWNLOAD_OFFLOAD_HEADER: Optional[str] = None
+    DOWNLOAD_OFFLOAD_PREFIX: str = "/protected-outputs"
+    ACQUISITION_CACHE_TTL: int = 3600
+    # Seconds between two purges of the expired entries of the SQLite state backend
+    STATE_PURGE_INTERVAL: int = 300
+
+    # Upstream quotas (requests per minute) and job admission, for the whole deployment
+    PSI_REQUESTS_PER_MINUTE: int = 240
+    JINA_REQUESTS_PER_MINUTE: int = 200
+    OPENAI_REQUESTS_PER_MINUTE: int = 500
+    UPSTREAM_MAX_WAIT: int = 60
+    # Timeout of each PageSpeed Insights call, in seconds
+    PSI_TIMEOUT: int = 30
+    # PageSpeed Insights categories missing after this many seconds are analyzed locally
+    # meanwhile, and replaced by the local findings if PSI is still missing them then
+    PSI_FALLBACK_AFTER: float = 8.0
+    # Timeout of each Jina AI call and of each LLM completion, in seconds
+    JINA_TIMEOUT: int = 60
+    LLM_TIMEOUT: int = 120
+    # Bytes read per Jina AI format; larger pages are truncated, bounding memory per job
+    JINA_MAX_BYTES: int = 5 * 1024 * 1024
+    MAX_CONCURRENT_JOBS: int = 4
+    MAX_QUEUED_JOBS: int = 16
+    # Fast jobs use no LLM and are admitted separately; each holds a worker thread and
+    # makes one call per PSI category at once
+    MAX_CONCURRENT_FAST_JOBS: int = 8
+    MAX_QUEUED_FAST_JOBS: int = 32
+    # Seconds the job slots and queue entries of a crashed worker are held, and how often
+    # queued jobs check for a free slot
+    ADMISSION_LEASE: int = 30
+    ADMISSION_POLL_INTERVAL: float = 0.5
+
+    # Checkpoints of acquisition results and task outputs, for resuming failed jobs
+    CHECKPOINT_TTL: int = 7 * 24 * 3600
+    # A report branch failing is retried on its own this many times
+    BRANCH_RETRIES: int = 1
+    # Running jobs not updated for this long are considered interrupted and resumable
+    JOB_STALE_AFTER: int = 3600
+    # How often client disconnects and cancellation requests are checked, in seconds
+    CANCEL_POLL_INTERVAL: float = 1.0
+    # Seconds between two stack samples of a profiled job
+    PROFILE_SAMPLE_INTERVAL: float = 0.01
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -1,23 +1,85 @@
+import asyncio
 import os
+import uuid
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from src.config.settings import get_settings
 from src.logger.logger import get_logger
-from src.schemas.schema_generator import GenerateReportRequest
-from src.services.service_generator import agenerate_report
+from src.schemas.schema_generator import MAX_PRIORITY, GenerateReportRequest
+from src.services.service_cancel import (
+    JobCancelled,
+    cancel_job,
+    clear_cancellation,
+    raise_if_cancelled,
+)
+from src.services.service_download import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    build_offload_response,
+    build_report_response,
+    get_content_etag,
+    is_valid_job_id,
+    iter_zip_stream,
+)
+from src.services.service_generator import (
+    REPORT_TYPES,
+    ReportBranchesFailed,
+    agenerate_report,
+    get_job,
+    get_job_output_dir,
+    get_published_version,
+    get_report_pdf_path,
+    is_job_resumable,
+    rerun_branch,
+    set_job_status,
+)
+from src.services.service_metrics import get_metrics, increment_counter
+from src.services.service_profiler import PROFILE_ARTIFACTS
+from src.services.service_rate_limit import (
+    AdmissionRejected,
+    admission_controller,
+    fast_admission_controller,
+)
+from src.services.service_state import get_state_backend
 
 settings = get_settings()
 logger = get_logger(__file__)
 
 router = APIRouter(prefix="/generator")
 
+PROFILE_MEDIA_TYPES = {
+    "collapsed": "text/plain",
+    "pstats": "application/octet-stream",
+    "summary": "application/json",
+}
 
-@router.post(path="/generate-reports")
-async def generate_reports(generate_report_request: GenerateReportRequest):
+
+async def _run_job(
+    job_id: str,
+    url: str,
+    incremental: bool,
+    priority: int,
+    mode: str,
+    profile: bool = False,
+) -> dict:
     try:
-        url = generate_report_request.url
-        report_pdf_file_paths = await agenerate_report(url)
+        if mode == "fast":
+            # Fast jobs use no LLM, so they are admitted apart from the full jobs
+            async with fast_admission_controller.admit(priority, job_id):
+                await run_in_threadpool(raise_if_cancelled, job_id)
+                report_pdf_file_paths, diff_summary = await agenerate_report(
+                    url, job_id, mode="fast", profile=profile
+                )
+        else:
+            async with admission_controller.admit(priority, job_id):
+                # The job may have been cancelled just as it got its slot
+                await run_in_threadpool(raise_if_cancelled, job_id)
+                report_pdf_file_paths, diff_summary = await agenerate_report(
+                    url, job_id, incremental, profile=profile
+                )
 
         if not report_pdf_file_paths or len(report_pdf_file_paths) < 3:
             logger.error("Report generation failed, insufficient paths returned.")
@@ -39,47 +101,340 @@ async def generate_reports(generate_report_request: GenerateReportRequest):
             logger.error(f"SEO Report PDF not found: {seo_report_path}")
             raise HTTPException(status_code=404, detail="SEO report not found")
 
-        return {
-            "frontend_report_url": f"/generator/download-report?type=frontend",
-            "ui_ux_report_url": f"/generator/download-report?type=ui_ux",
-            "seo_report_url": f"/generator/download-report?type=seo",
+        # URLs of the reports of this run, which never change
+        job = await run_in_threadpool(get_job, job_id)
+        version = get_published_version(job)
+        response = {
+            "job_id": job_id,
+            "version": version,
+            "frontend_report_url": f"/generator/download-report?type=frontend&job_id={job_id}&version={version}",
+            "ui_ux_report_url": f"/generator/download-report?type=ui_ux&job_id={job_id}&version={version}",
+            "seo_report_url": f"/generator/download-report?type=seo&job_id={job_id}&version={version}",
+            "bundle_url": f"/generator/download-bundle?job_id={job_id}&version={version}",
+            "diff_summary": diff_summary,
         }
+        if profile:
+            response["profile_urls"] = {
+                format: f"/generator/jobs/{job_id}/profile?format={format}"
+                for format in PROFILE_ARTIFACTS
+            }
+        return response
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected job {job_id}: {e}")
+        await run_in_threadpool(set_job_status, job_id, "rejected")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many report jobs in progress, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except JobCancelled as e:
+        logger.info(str(e))
+        await run_in_threadpool(set_job_status, job_id, "cancelled", reason=e.reason)
+        await run_in_threadpool(increment_counter, f"jobs_cancelled:{e.reason}")
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "The job was cancelled", "job_id": job_id},
+        )
+    except ReportBranchesFailed as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        await run_in_threadpool(
+            set_job_status,
+            job_id,
+            "failed",
+            error=str(e),
+            failed_branches=e.failed_branches,
+        )
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "message": "Some reports could not be generated",
+                "job_id": job_id,
+                "failed_branches": e.failed_branches,
+                "resume_url": f"/generator/jobs/{job_id}/resume",
+            },
+        )
     except Exception as e:
         logger.error(f"Critical Error occurred in generate_reports: {e}")
+        await run_in_threadpool(set_job_status, job_id, "failed", error=str(e))
         raise HTTPException(
-            status_code=500, detail="An error occurred while generating the reports"
+            status_code=500,
+            detail={
+                "message": "An error occurred while generating the reports",
+                "job_id": job_id,
+                "resume_url": f"/generator/jobs/{job_id}/resume",
+            },
         )
 
 
-@router.get(path="/download-report")
-async def download_report(type: str):
+async def _cancel_on_disconnect(request: Request, job_id: str):
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.CANCEL_POLL_INTERVAL)
+    await run_in_threadpool(cancel_job, job_id, "client_disconnected")
+
+
+async def _run_job_until_disconnect(request: Request, job_id: str, *args) -> dict:
+    """
+    Runs a job, cancelling it if the client disconnects before it completes.
+    """
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, job_id))
     try:
-        if type == "frontend":
-            report_pdf_file_path = "outputs/frontend_report.pdf"
-            filename = "frontend_report.pdf"
-        elif type == "ui_ux":
-            report_pdf_file_path = "outputs/ui_ux_report.pdf"
-            filename = "ui_ux_report.pdf"
-        elif type == "seo":
-            report_pdf_file_path = "outputs/seo_report.pdf"
-            filename = "seo_report.pdf"
-        else:
-            raise HTTPException(status_code=400, detail="Invalid report type")
+        return await _run_job(job_id, *args)
+    finally:
+        watcher.cancel()
 
-        if not os.path.exists(report_pdf_file_path):
-            logger.error(f"Report PDF file not found: {report_pdf_file_path}")
-            raise HTTPException(
-                status_code=404, detail=f"Report not found: {report_pdf_file_path}"
-            )
 
-        return FileResponse(
+@router.post(path="/generate-reports")
+async def generate_reports(
+    request: Request, generate_report_request: GenerateReportRequest
+):
+    job_id = uuid.uuid4().hex
+    await run_in_threadpool(
+        set_job_status,
+        job_id,
+        "queued",
+        url=generate_report_request.url,
+        mode=generate_report_request.mode,
+        incremental=generate_report_request.incremental,
+        priority=generate_report_request.priority,
+        profile=generate_report_request.profile,
+    )
+    return await _run_job_until_disconnect(
+        request,
+        job_id,
+        generate_report_request.url,
+        generate_report_request.incremental,
+        generate_report_request.priority,
+        generate_report_request.mode,
+        generate_report_request.profile,
+    )
+
+
+async def _resume_job(request: Request, job_id: str, job: dict, prepare=None) -> dict:
+    """
+    Runs a job again from its checkpoints, after calling prepare if given.
+    """
+    # Only one request may resume a job, even across workers
+    backend = get_state_backend()
+    if not await run_in_threadpool(
+        backend.add,
+        "resumes",
+        job_id,
+        {"pid": os.getpid()},
+        ttl=settings.JOB_STALE_AFTER,
+    ):
+        raise HTTPException(status_code=409, detail="Job is already being resumed")
+    try:
+        if prepare is not None:
+            await run_in_threadpool(prepare)
+        logger.info(f"Resuming job {job_id}")
+        await run_in_threadpool(clear_cancellation, job_id)
+        return await _run_job_until_disconnect(
+            request,
+            job_id,
+            job["url"],
+            job.get("incremental", True),
+            # Jobs recorded before priorities were bounded may hold any value
+            min(max(job.get("priority", 0), 0), MAX_PRIORITY),
+            job.get("mode", "full"),
+            job.get("profile", False),
+        )
+    finally:
+        await run_in_threadpool(backend.delete, "resumes", job_id)
+
+
+@router.post(path="/jobs/{job_id}/resume")
+async def resume_job(request: Request, job_id: str):
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not is_job_resumable(job):
+        raise HTTPException(
+            status_code=409, detail=f"Job cannot be resumed: {job['status']}"
+        )
+
+    return await _resume_job(request, job_id, job)
+
+
+@router.post(path="/jobs/{job_id}/branches/{type}/rerun")
+async def rerun_job_branch(request: Request, job_id: str, type: str):
+    if type not in REPORT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid report type")
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.get("mode") == "fast":
+        raise HTTPException(
+            status_code=409, detail="Fast jobs have no report branch to rerun"
+        )
+    if job["status"] != "completed" and not is_job_resumable(job):
+        raise HTTPException(
+            status_code=409, detail=f"Job cannot be resumed: {job['status']}"
+        )
+
+    def prepare():
+        try:
+            rerun_branch(job_id, type)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    return await _resume_job(request, job_id, job, prepare)
+
+
+@router.post(path="/jobs/{job_id}/cancel", status_code=202)
+async def cancel_job_request(job_id: str):
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] not in ("queued", "running"):
+        raise HTTPException(
+            status_code=409, detail=f"Job cannot be cancelled: {job['status']}"
+        )
+
+    await run_in_threadpool(cancel_job, job_id, "cancel_requested")
+    return {"job_id": job_id, "status": "cancelling"}
+
+
+@router.get(path="/metrics")
+async def metrics():
+    return await run_in_threadpool(get_metrics)
+
+
+@router.get(path="/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def _file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    stat_result,
+    media_type: str = "application/pdf",
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+):
+    if settings.DOWNLOAD_OFFLOAD_HEADER:
+        return build_offload_response(
+            path, filename, media_type=media_type, cache_control=cache_control
+        )
+
+    etag = await run_in_threadpool(get_content_etag, path, stat_result)
+    return build_report_response(
+        request.headers,
+        path,
+        filename,
+        stat_result,
+        etag,
+        media_type=media_type,
+        cache_control=cache_control,
+    )
+
+
+async def _resolve_version(job_id: str, version: Optional[int]) -> tuple:
+    """
+    Returns the version of a job's reports to serve and its Cache-Control: a requested
+    version never changes, while the latest one is revalidated.
+    """
+    if version is not None:
+        return version, IMMUTABLE_CACHE_CONTROL
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return get_published_version(job), REVALIDATE_CACHE_CONTROL
+
+
+@router.get(path="/jobs/{job_id}/profile")
+async def download_profile(request: Request, job_id: str, format: str = "collapsed"):
+    if format not in PROFILE_ARTIFACTS:
+        raise HTTPException(status_code=400, detail="Invalid profile format")
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    profile_file_path = os.path.join(
+        get_job_output_dir(job_id), PROFILE_ARTIFACTS[format]
+    )
+    try:
+        stat_result = os.stat(profile_file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return await _file_response(
+        request,
+        profile_file_path,
+        f"{job_id}_{PROFILE_ARTIFACTS[format]}",
+        stat_result,
+        media_type=PROFILE_MEDIA_TYPES[format],
+    )
+
+
+@router.get(path="/download-report")
+async def download_report(
+    request: Request, type: str, job_id: str, version: Optional[int] = None
+):
+    if type not in REPORT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid report type")
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    version, cache_control = await _resolve_version(job_id, version)
+    report_pdf_file_path = get_report_pdf_path(job_id, type, version)
+    try:
+        stat_result = os.stat(report_pdf_file_path)
+    except FileNotFoundError:
+        logger.error(f"Report PDF file not found: {report_pdf_file_path}")
+        raise HTTPException(status_code=404, detail=f"Report not found: {type}")
+
+    try:
+        return await _file_response(
+            request,
             report_pdf_file_path,
-            media_type="application/pdf",
-            filename=filename,
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            f"{type}_report.pdf",
+            stat_result,
+            cache_control=cache_control,
         )
     except Exception as e:
         logger.error(f"Critical Error occurred in download_report: {e}")
         raise HTTPException(
             status_code=500, detail="An error occurred while downloading the report"
         )
+
+
+@router.get(path="/download-bundle")
+async def download_bundle(job_id: str, version: Optional[int] = None):
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    version, cache_control = await _resolve_version(job_id, version)
+    members = []
+    for report_type in REPORT_TYPES:
+        report_pdf_file_path = get_report_pdf_path(job_id, report_type, version)
+        if not os.path.isfile(report_pdf_file_path):
+            logger.error(f"Report PDF file not found: {report_pdf_file_path}")
+            raise HTTPException(
+                status_code=404, detail=f"Report not found: {report_type}"
+            )
+        members.append((f"{report_type}_report.pdf", report_pdf_file_path))
+
+    filename = f"reports_{job_id}.zip"
+    return StreamingResponse(
+        iter_zip_stream(members),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": cache_control,
+        },
+    )
@@ -1,5 +1,24 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
+MAX_PRIORITY = 10
+
 
 class GenerateReportRequest(BaseModel):
     url: str = Field(default="https://www.berkshirehathaway.com/")
+    incremental: bool = Field(default=True)
+    priority: int = Field(
+        default=0,
+        ge=0,
+        le=MAX_PRIORITY,
+        description="Higher priorities are admitted first",
+    )
+    mode: Literal["full", "fast"] = Field(
+        default="full",
+        description="fast renders the reports from the audits only, without LLM agents",
+    )
+    profile: bool = Field(
+        default=False,
+        description="Records a sampling profile of the job, downloadable with its reports",
+    )
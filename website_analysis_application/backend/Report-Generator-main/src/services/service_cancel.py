@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+from src.services.service_profiler import profiled
+from src.services.service_report_types import PSI_CATEGORIES, REPORT_TYPES
+from src.services.service_state import get_state_backend
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+CANCELLATION_REASONS = ("client_disconnected", "cancel_requested")
+
+# Job run by the current thread, so upstream calls deep in the tools and the LLM can
+# check its cancellation without the job id being passed around
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+# Runs the blocking upstream calls of jobs, so a job can stop waiting for them. A job
+# makes at most one call per PSI category at once while acquiring, then one per report
+# branch, so every admitted job (full or fast) gets its calls run without queueing.
+UPSTREAM_WORKERS = (
+    settings.MAX_CONCURRENT_JOBS + settings.MAX_CONCURRENT_FAST_JOBS
+) * max(len(PSI_CATEGORIES), len(REPORT_TYPES))
+_upstream_executor = ThreadPoolExecutor(
+    max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream"
+)
+
+
+class JobCancelled(Exception):
+    """
+    Raised in a job's thread once its cancellation has been requested.
+    """
+
+    def __init__(self, job_id: str, reason: str):
+        self.job_id = job_id
+        self.reason = reason
+        super().__init__(f"Job {job_id} cancelled: {reason}")
+
+
+def cancel_job(job_id: str, reason: str):
+    """
+    Requests the cancellation of a job, seen by whichever worker runs it.
+    """
+    logger.info(f"Cancelling job {job_id}: {reason}")
+    get_state_backend().set(
+        "cancellations", job_id, {"reason": reason}, ttl=settings.JOB_STALE_AFTER
+    )
+
+
+def clear_cancellation(job_id: str):
+    """
+    Withdraws a cancellation request, e.g. when a cancelled job is resumed.
+    """
+    get_state_backend().delete("cancellations", job_id)
+
+
+def raise_if_cancelled(job_id: Optional[str] = None):
+    """
+    Raises JobCancelled if the cancellation of the job (by default, the current thread's
+    job) has been requested.
+    """
+    job_id = job_id or current_job_id.get()
+    if job_id is None:
+        return
+    cancellation = get_state_backend().get("cancellations", job_id)
+    if cancellation is not None:
+        raise JobCancelled(job_id, cancellation["reason"])
+
+
+def run_cancellable(
+    function: Callable, *args, abort: Optional[Callable] = None, **kwargs
+):
+    """
+    Runs a blocking call (an HTTP request, an LLM completion) for the current job, and
+    stops waiting for it as soon as the job is cancelled. abort is then called to stop
+    the call in flight; without it, the call finishes in the background and its result
+    is discarded.
+    """
+    job_id = current_job_id.get()
+    if job_id is None:
+        return function(*args, **kwargs)
+
+    raise_if_cancelled(job_id)
+    future = _upstream_executor.submit(profiled(function, "upstream"), *args, **kwargs)
+    while True:
+        try:
+            return future.result(timeout=settings.CANCEL_POLL_INTERVAL)
+        except FutureTimeoutError:
+            try:
+                raise_if_cancelled(job_id)
+            except JobCancelled:
+                if not future.cancel() and abort is not None:
+                    try:
+                        abort()
+                    except Exception as e:
+                        logger.warning(f"Aborting a call of job {job_id} failed: {e}")
+                raise
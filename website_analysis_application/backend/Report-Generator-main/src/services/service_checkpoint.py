@@ -0,0 +1,64 @@
+import time
+from typing import Callable, Optional
+
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+from src.services.service_state import get_state_backend
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+ACQUISITION_CHECKPOINT = "acquisition"
+# Data acquired for the branches generated again, kept apart from the (small)
+# acquisition checkpoint, which is rewritten when a branch is rerun
+ACQUIRED_DATA_CHECKPOINT = "acquired_data"
+
+
+def _checkpoint_key(job_id: str, name: str) -> str:
+    return f"{job_id}:{name}"
+
+
+def save_checkpoint(job_id: str, name: str, value: dict):
+    """
+    Durably records a completed step of a job, so a resumed job does not redo it.
+    """
+    get_state_backend().set(
+        "checkpoints",
+        _checkpoint_key(job_id, name),
+        {**value, "completed_at": time.time()},
+        ttl=settings.CHECKPOINT_TTL,
+    )
+
+
+def load_checkpoint(job_id: str, name: str) -> Optional[dict]:
+    """
+    Returns the recorded result of a step of a job, or None if it did not complete.
+    """
+    return get_state_backend().get("checkpoints", _checkpoint_key(job_id, name))
+
+
+def delete_checkpoint(job_id: str, name: str):
+    """
+    Forgets a completed step of a job, so resuming the job runs it again.
+    """
+    get_state_backend().delete("checkpoints", _checkpoint_key(job_id, name))
+
+
+def task_checkpoint_name(task_name: str) -> str:
+    return f"task:{task_name}"
+
+
+def task_checkpointer(job_id: str) -> Callable:
+    """
+    Returns a crewai task callback recording the raw output of each completed task.
+    """
+
+    def checkpoint_task(output):
+        save_checkpoint(
+            job_id,
+            task_checkpoint_name(output.name),
+            {"raw": output.raw, "agent": output.agent},
+        )
+        logger.info(f"Job {job_id}: checkpointed task {output.name}")
+
+    return checkpoint_task
@@ -1,145 +1,171 @@
-from typing import Dict
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
 
 from crewai import Agent
+from src.services.service_crewai.shared_context import (
+    AGENT_CONTEXT_INPUTS,
+    shared_context_templates,
+)
 from src.services.service_crewai.tools import *
 
-
-def create_agents(llm, vision_llm) -> Dict[str, Agent]:
-
-    frontend_specialist = Agent(
-        role="Front-End Development Specialist",
-        goal="Identify and analyze front-end issues, focusing primarily on HTML-related bugs, structure, and best practices, to ensure optimal performance and adherence to standards.",
-        backstory="With over a decade of experience in advanced front-end development, you specialize in diagnosing critical issues within HTML, CSS, and JavaScript, with a keen focus on HTML structure and accessibility. You are proficient in debugging complex front-end code and optimizing for performance and standards compliance.",
-        description=(
-            "You will perform an in-depth technical analysis of the following areas using the specified tools:\n"
-            "1. **HTML Structure**: Use `get_jina_ai_html` to identify semantic HTML issues, improper nesting, missing tags, and non-compliance with HTML5 standards.\n"
-            "2. **Accessibility**: Use `get_page_speed_insights_accessibility` to examine HTML for accessibility-related issues such as missing ARIA attributes and alternative text for images.\n"
-            "3. **Performance**: Use `get_page_speed_insights_performance` to analyze the HTML for performance bottlenecks, such as unnecessary DOM elements and inefficient structures.\n"
-            "4. **Best Practices**: Use `get_page_speed_insights_best_practices` to evaluate HTML code against industry best practices for maintainability and scalability.\n\n"
-            "Output should be brief, highlighting key findings and recommended actions."
+# Immutable agent definitions, built once per process and bound to each job's LLMs.
+# Delegation is disabled: every task runs in a crew of its own agent, which has no
+# coworker to delegate to.
+AGENT_TEMPLATES: Mapping[str, Mapping] = MappingProxyType(
+    {
+        "frontend_specialist_Agent": MappingProxyType(
+            dict(
+                role="Front-End Development Specialist",
+                goal="Identify and analyze front-end issues, focusing primarily on HTML-related bugs, structure, and best practices, to ensure optimal performance and adherence to standards.",
+                backstory="With over a decade of experience in advanced front-end development, you specialize in diagnosing critical issues within HTML, CSS, and JavaScript, with a keen focus on HTML structure and accessibility. You are proficient in debugging complex front-end code and optimizing for performance and standards compliance.",
+                description=(
+                    "You will perform an in-depth technical analysis of the following areas using the specified tools:\n"
+                    "1. **HTML Structure**: Use `get_jina_ai_html` to identify semantic HTML issues, improper nesting, missing tags, and non-compliance with HTML5 standards.\n"
+                    "2. **Accessibility**: Use `get_page_speed_insights_accessibility` to examine HTML for accessibility-related issues such as missing ARIA attributes and alternative text for images.\n"
+                    "3. **Performance**: Use `get_page_speed_insights_performance` to analyze the HTML for performance bottlenecks, such as unnecessary DOM elements and inefficient structures.\n"
+                    "4. **Best Practices**: Use `get_page_speed_insights_best_practices` to evaluate HTML code against industry best practices for maintainability and scalability.\n\n"
+                    "Output should be brief, highlighting key findings and recommended actions."
+                ),
+                tools=(
+                    get_page_speed_insights_accessibility,
+                    get_page_speed_insights_best_practices,
+                    get_page_speed_insights_performance,
+                    get_jina_ai_html,
+                ),
+                allow_delegation=False,
+            )
         ),
-        tools=[
-            get_page_speed_insights_accessibility,
-            get_page_speed_insights_best_practices,
-            get_page_speed_insights_performance,
-            get_jina_ai_html,
-        ],
-        verbose=False,
-        allow_delegation=True,
-        llm=llm,
-    )
-
-    frontend_report_analyst = Agent(
-        role="Front-End Report Creator",
-        goal="Create a concise technical report summarizing findings from the Front-End Specialist with prioritized recommendations.",
-        backstory="With a deep understanding of front-end issues, you excel at crafting brief and actionable reports based on analysis results.",
-        description=(
-            "Your report will follow this structure:\n"
-            "1. **Key Findings**: Summarize critical issues related to HTML structure, accessibility, and performance.\n"
-            "2. **Top 3 Issues**: Briefly describe the three most impactful issues and suggest solutions.\n"
-            "3. **Recommended Actions**: Provide a concise action plan prioritized by importance.\n\n"
-            "Ensure the output is concise and directly actionable."
+        "frontend_report_analyst_Agent": MappingProxyType(
+            dict(
+                role="Front-End Report Creator",
+                goal="Create a concise technical report summarizing findings from the Front-End Specialist with prioritized recommendations.",
+                backstory="With a deep understanding of front-end issues, you excel at crafting brief and actionable reports based on analysis results.",
+                description=(
+                    "Your report will follow this structure:\n"
+                    "1. **Key Findings**: Summarize critical issues related to HTML structure, accessibility, and performance.\n"
+                    "2. **Top 3 Issues**: Briefly describe the three most impactful issues and suggest solutions.\n"
+                    "3. **Recommended Actions**: Provide a concise action plan prioritized by importance.\n\n"
+                    "Ensure the output is concise and directly actionable."
+                ),
+                allow_delegation=False,
+            )
         ),
-        verbose=False,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    image_analysis_agent = Agent(
-        role="Image Analysis Specialist",
-        goal="Analyze images to extract deep insights into UI/UX design and SEO factors, ensuring a clear focus on design improvements and SEO optimization.",
-        backstory="As an expert in UI/UX and image analysis, you specialize in leveraging vision-enabled LLMs to evaluate visual assets for design consistency, accessibility compliance, and SEO-related factors that influence user experience and search engine performance.",
-        description=(
-            "This agent performs detailed analysis in two main areas using the specified tools:\n"
-            "1. **UI/UX Analysis**: Use `get_jina_ai_screenshot` to evaluate layout, design consistency, color schemes, typography, and usability.\n"
-            "2. **SEO Optimization**: Use `get_jina_ai_screenshot` to identify image-related SEO issues, such as missing alt attributes, improper image sizes, and load times.\n\n"
-            "Output should be brief, with a focus on actionable insights and recommendations."
+        "image_analysis_Agent": MappingProxyType(
+            dict(
+                role="Image Analysis Specialist",
+                goal="Analyze images to extract deep insights into UI/UX design and SEO factors, ensuring a clear focus on design improvements and SEO optimization.",
+                backstory="As an expert in UI/UX and image analysis, you specialize in leveraging vision-enabled LLMs to evaluate visual assets for design consistency, accessibility compliance, and SEO-related factors that influence user experience and search engine performance.",
+                description=(
+                    "This agent performs detailed analysis in two main areas using the specified tools:\n"
+                    "1. **UI/UX Analysis**: Use `get_jina_ai_screenshot` to evaluate layout, design consistency, color schemes, typography, and usability.\n"
+                    "2. **SEO Optimization**: Use `get_jina_ai_screenshot` to identify image-related SEO issues, such as missing alt attributes, improper image sizes, and load times.\n\n"
+                    "Output should be brief, with a focus on actionable insights and recommendations."
+                ),
+                tools=(get_jina_ai_screenshot,),
+                allow_delegation=False,
+            )
         ),
-        tools=[get_jina_ai_screenshot],
-        verbose=False,
-        allow_delegation=True,
-        llm=vision_llm,
-    )
-
-    ui_ux_specialist = Agent(
-        role="User Interface & User Experience Specialist",
-        goal="Conduct a deep-dive technical evaluation of the website's design, accessibility, and usability, with a focus on UI/UX principles and best practices.",
-        backstory="With extensive expertise in modern design systems, UI/UX principles, and accessibility standards, you specialize in evaluating the technical implementation of responsive design, accessibility compliance, and the usability of interactive components.",
-        description=(
-            "You will evaluate the following aspects of the website using the specified tools:\n"
-            "1. **Design Implementation**: Use `get_jina_ai_text` to review CSS architecture, grid systems, and design tokens for scalability, efficiency, and consistency.\n"
-            "2. **Accessibility**: Use `get_page_speed_insights_accessibility` to ensure WCAG 2.1 AA/AAA standards compliance.\n"
-            "3. **Usability**: Use `get_jina_ai_text` to analyze navigation, consistency, and interaction design.\n"
-            "4. **Interactive Components**: Assess interactive elements for usability and responsiveness.\n\n"
-            "Output should focus on key findings and short, actionable improvement steps."
+        "ui_ux_specialist_Agent": MappingProxyType(
+            dict(
+                role="User Interface & User Experience Specialist",
+                goal="Conduct a deep-dive technical evaluation of the website's design, accessibility, and usability, with a focus on UI/UX principles and best practices.",
+                backstory="With extensive expertise in modern design systems, UI/UX principles, and accessibility standards, you specialize in evaluating the technical implementation of responsive design, accessibility compliance, and the usability of interactive components.",
+                description=(
+                    "You will evaluate the following aspects of the website using the specified tools:\n"
+                    "1. **Design Implementation**: Use `search_page_content` (e.g. 'layout', 'design system') to review CSS architecture, grid systems, and design tokens for scalability, efficiency, and consistency.\n"
+                    "2. **Accessibility**: Use `get_page_speed_insights_accessibility` to ensure WCAG 2.1 AA/AAA standards compliance.\n"
+                    "3. **Usability**: Use `search_page_content` (e.g. 'navigation', 'forms', 'call to action') to analyze navigation, consistency, and interaction design.\n"
+                    "4. **Interactive Components**: Assess interactive elements for usability and responsiveness.\n\n"
+                    "Output should focus on key findings and short, actionable improvement steps."
+                ),
+                tools=(get_page_speed_insights_accessibility, search_page_content),
+                allow_delegation=False,
+            )
         ),
-        tools=[get_page_speed_insights_accessibility, get_jina_ai_text],
-        verbose=False,
-        allow_delegation=True,
-        llm=llm,
-    )
-
-    ui_ux_report_analyst = Agent(
-        role="UI/UX Report Creator",
-        goal="Generate a brief and actionable UI/UX report focused on prioritized improvements.",
-        backstory="With expertise in creating concise reports, you highlight key findings and provide a straightforward improvement plan.",
-        description=(
-            "Your report will follow this structure:\n"
-            "1. **Summary**: Highlight key findings related to design, accessibility, and usability.\n"
-            "2. **Critical Issues**: Briefly explain the top three issues affecting the user experience and suggest fixes.\n"
-            "3. **Improvement Steps**: Provide a short, prioritized list of actions to enhance UI/UX design and usability.\n\n"
-            "Ensure the report is concise and actionable."
+        "ui_ux_report_analyst_Agent": MappingProxyType(
+            dict(
+                role="UI/UX Report Creator",
+                goal="Generate a brief and actionable UI/UX report focused on prioritized improvements.",
+                backstory="With expertise in creating concise reports, you highlight key findings and provide a straightforward improvement plan.",
+                description=(
+                    "Your report will follow this structure:\n"
+                    "1. **Summary**: Highlight key findings related to design, accessibility, and usability.\n"
+                    "2. **Critical Issues**: Briefly explain the top three issues affecting the user experience and suggest fixes.\n"
+                    "3. **Improvement Steps**: Provide a short, prioritized list of actions to enhance UI/UX design and usability.\n\n"
+                    "Ensure the report is concise and actionable."
+                ),
+                allow_delegation=False,
+            )
         ),
-        verbose=False,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    seo_specialist = Agent(
-        role="Search Engine Optimization Specialist",
-        goal="Conduct a comprehensive SEO audit, focusing on technical SEO aspects such as crawlability, indexing, page speed, metadata optimization, and structured data.",
-        backstory="As a seasoned SEO professional, you specialize in diagnosing and addressing technical SEO issues that impact search engine rankings and user experience. Your expertise lies in ensuring that websites are optimized for search engines and perform well in terms of indexing and speed.",
-        description=(
-            "You will evaluate the following aspects of the website using the specified tools:\n"
-            "1. **Crawlability**: Use `get_page_speed_insights_seo` to identify blocked resources or crawl errors.\n"
-            "2. **Indexing**: Use `get_jina_ai_text` to ensure proper content indexing.\n"
-            "3. **Page Speed**: Use `get_page_speed_insights_performance` to evaluate Core Web Vitals and page load times.\n"
-            "4. **Metadata Optimization**: Use `get_jina_ai_text` to review and optimize meta tags.\n"
-            "5. **Structured Data**: Validate structured data using `get_page_speed_insights_seo` for enhanced search visibility.\n\n"
-            "Output should focus on key findings and prioritized recommendations."
+        "seo_specialist_Agent": MappingProxyType(
+            dict(
+                role="Search Engine Optimization Specialist",
+                goal="Conduct a comprehensive SEO audit, focusing on technical SEO aspects such as crawlability, indexing, page speed, metadata optimization, and structured data.",
+                backstory="As a seasoned SEO professional, you specialize in diagnosing and addressing technical SEO issues that impact search engine rankings and user experience. Your expertise lies in ensuring that websites are optimized for search engines and perform well in terms of indexing and speed.",
+                description=(
+                    "You will evaluate the following aspects of the website using the specified tools:\n"
+                    "1. **Crawlability**: Use `get_page_speed_insights_seo` to identify blocked resources or crawl errors.\n"
+                    "2. **Indexing**: Use `search_page_content` (e.g. 'headings', 'main content') to ensure proper content indexing.\n"
+                    "3. **Page Speed**: Use `get_page_speed_insights_performance` to evaluate Core Web Vitals and page load times.\n"
+                    "4. **Metadata Optimization**: Use `search_page_content` (e.g. 'meta tags', 'title and description') to review and optimize meta tags.\n"
+                    "5. **Structured Data**: Validate structured data using `get_page_speed_insights_seo` for enhanced search visibility.\n\n"
+                    "Output should focus on key findings and prioritized recommendations."
+                ),
+                tools=(
+                    get_page_speed_insights_seo,
+                    get_page_speed_insights_performance,
+                    search_page_content,
+                ),
+                allow_delegation=False,
+            )
         ),
-        tools=[
-            get_page_speed_insights_seo,
-            get_page_speed_insights_performance,
-            get_jina_ai_text,
-        ],
-        verbose=False,
-        allow_delegation=True,
-        llm=llm,
-    )
-
-    seo_report_analyst = Agent(
-        role="SEO Report Creator",
-        goal="Provide a succinct SEO audit report with actionable steps for optimization.",
-        backstory="You specialize in summarizing technical SEO audits into clear and concise recommendations.",
-        description=(
-            "Your report will follow this structure:\n"
-            "1. **Overview**: Summarize key findings in crawlability, indexing, page speed, and structured data.\n"
-            "2. **Major Issues**: Briefly explain the top three SEO issues and suggest possible resolutions.\n"
-            "3. **Optimization Plan**: Provide a short, prioritized action list to resolve issues and enhance SEO performance.\n\n"
-            "Ensure the report is concise and actionable."
+        "seo_report_analyst_Agent": MappingProxyType(
+            dict(
+                role="SEO Report Creator",
+                goal="Provide a succinct SEO audit report with actionable steps for optimization.",
+                backstory="You specialize in summarizing technical SEO audits into clear and concise recommendations.",
+                description=(
+                    "Your report will follow this structure:\n"
+                    "1. **Overview**: Summarize key findings in crawlability, indexing, page speed, and structured data.\n"
+                    "2. **Major Issues**: Briefly explain the top three SEO issues and suggest possible resolutions.\n"
+                    "3. **Optimization Plan**: Provide a short, prioritized action list to resolve issues and enhance SEO performance.\n\n"
+                    "Ensure the report is concise and actionable."
+                ),
+                allow_delegation=False,
+            )
         ),
-        verbose=False,
-        allow_delegation=False,
-        llm=llm,
-    )
+    }
+)
+
+VISION_AGENTS = frozenset({"image_analysis_Agent"})
+
+# Agents analyzing the acquired site data, which gets written in their prompt prefix
+SPECIALIST_AGENTS = frozenset(AGENT_CONTEXT_INPUTS)
+
+
+def create_agents(
+    llm, vision_llm, shared_contexts: Optional[Dict[str, str]] = None
+) -> Dict[str, Agent]:
+    """
+    Binds the agent templates to a job's LLMs and to the shared contexts of its
+    specialists, by agent name.
+    Agents hold per-run state (executor, token usage), so each job gets its own.
+    """
+
+    # Specialists put the job's site data before their own instructions, so the prompt
+    # prefix they have in common is served from the provider's prompt cache
+    shared_contexts = shared_contexts or {}
 
     return {
-        "frontend_specialist_Agent": frontend_specialist,
-        "frontend_report_analyst_Agent": frontend_report_analyst,
-        "image_analysis_Agent": image_analysis_agent,
-        "ui_ux_specialist_Agent": ui_ux_specialist,
-        "ui_ux_report_analyst_Agent": ui_ux_report_analyst,
-        "seo_specialist_Agent": seo_specialist,
-        "seo_report_analyst_Agent": seo_report_analyst,
-    }
\ No newline at end of file
+        name: Agent(
+            **{**template, "tools": list(template.get("tools", ()))},
+            verbose=False,
+            llm=vision_llm if name in VISION_AGENTS else llm,
+            **(
+                shared_context_templates(shared_contexts[name])
+                if name in shared_contexts
+                else {}
+            ),
+        )
+        for name, template in AGENT_TEMPLATES.items()
+    }
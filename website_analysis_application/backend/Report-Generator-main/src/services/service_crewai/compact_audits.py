@@ -0,0 +1,139 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+from src.logger.logger import get_logger
+from src.services.service_report_types import PASSING_SCORE
+
+logger = get_logger(__file__)
+
+MAX_DETAIL_ITEMS = 3
+MAX_DETAIL_VALUE_LENGTH = 120
+
+LEARN_MORE_PATTERN = re.compile(r"\s*\[Learn (more|how)[^\]]*\]\([^)]*\)\.?", re.I)
+
+
+def compact_details(details: Optional[dict]) -> Optional[list]:
+    """
+    Keeps the top offending items of a Lighthouse audit's details, scalar fields only.
+    Lighthouse already sorts the items by wasted bytes / time.
+    """
+    if not isinstance(details, dict):
+        return None
+
+    items = []
+    for item in details.get("items", [])[:MAX_DETAIL_ITEMS]:
+        if not isinstance(item, dict):
+            continue
+        compact_item = {}
+        for key, value in item.items():
+            if isinstance(value, str):
+                compact_item[key] = value[:MAX_DETAIL_VALUE_LENGTH]
+            elif isinstance(value, (int, float, bool)):
+                compact_item[key] = (
+                    round(value, 2) if isinstance(value, float) else value
+                )
+            elif isinstance(value, dict) and value.get("type") == "node":
+                compact_item[key] = (value.get("snippet") or "")[
+                    :MAX_DETAIL_VALUE_LENGTH
+                ]
+        if compact_item:
+            items.append(compact_item)
+    return items or None
+
+
+def strip_learn_more(description: Optional[str]) -> Optional[str]:
+    """
+    Removes the "Learn more" documentation links from an audit description.
+    """
+    if not description:
+        return description
+    return LEARN_MORE_PATTERN.sub("", description).strip()
+
+
+def compact_category_data(data: dict) -> dict:
+    """
+    Encodes a category result for the agents: only failing audits (below PASSING_SCORE),
+    with their measurements and top offending items. Descriptions are listed once in a table keyed
+    by audit id instead of being repeated inline.
+    """
+    if "error" in data:
+        return data
+
+    audits = []
+    descriptions = {}
+    for audit in data.get("audits", []):
+        score = audit.get("score")
+        if score is None or score >= PASSING_SCORE:
+            continue
+        compact_audit = {
+            key: audit[key]
+            for key in ("id", "title", "score", "numericValue", "displayValue")
+            if audit.get(key) is not None
+        }
+        details = audit.get("details")
+        if isinstance(details, dict):
+            details = compact_details(details)
+        elif isinstance(details, list):
+            details = details[:MAX_DETAIL_ITEMS]
+        if details:
+            compact_audit["details"] = details
+        audits.append(compact_audit)
+        description = strip_learn_more(audit.get("description"))
+        if description:
+            descriptions[audit["id"]] = description
+
+    compact = {
+        "url": data.get("final_url") or data.get("requested_url"),
+        "score": data.get("score"),
+        "failing_audits": audits,
+        "descriptions": descriptions,
+    }
+    if data.get("source") == "local":
+        compact["source"] = "local"
+    return compact
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.debug(f"tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts GPT-4o tokens, or estimates them as 4 characters per token without tiktoken.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+
+def measure_token_reduction(data: dict) -> dict:
+    """
+    Compares the tokens of the previous payload (every audit with id, title, description
+    and score) with the compact one, as both would be stringified into a prompt.
+    """
+    if "error" in data:
+        return {"full_tokens": 0, "compact_tokens": 0, "reduction": 0.0}
+
+    full_payload = {
+        **{key: value for key, value in data.items() if key != "audits"},
+        "audits": [
+            {key: audit.get(key) for key in ("id", "title", "description", "score")}
+            for audit in data.get("audits", [])
+        ],
+    }
+    full_tokens = count_tokens(str(full_payload))
+    compact_tokens = count_tokens(str(compact_category_data(data)))
+    return {
+        "full_tokens": full_tokens,
+        "compact_tokens": compact_tokens,
+        "reduction": round(1 - compact_tokens / full_tokens, 3) if full_tokens else 0.0,
+    }
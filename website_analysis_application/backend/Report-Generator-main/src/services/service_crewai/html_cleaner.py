@@ -0,0 +1,145 @@
+from html import escape
+from html.parser import HTMLParser
+from typing import List, Optional
+
+# Elements dropped with their content
+SKIPPED_ELEMENTS = {"script", "style"}
+
+# Elements without content, i.e. always empty once their attributes are cleared
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+
+class _OpenElement:
+    __slots__ = ("name", "emitted", "children", "in_text", "wraps_same_name", "slot")
+
+    def __init__(self, name: str):
+        self.name = name
+        # The start tag is only written once the element gets some content
+        self.emitted = False
+        # Child nodes (elements and text runs) seen so far, emitted or not
+        self.children = 0
+        self.in_text = False
+        # Its first child is an element of the same name, which it is merged into if
+        # that child turns out to be its only one
+        self.wraps_same_name = False
+        # Index of the output part reserved for the start tag until that is known
+        self.slot: Optional[int] = None
+
+
+class StreamingHTMLCleaner(HTMLParser):
+    """
+    Cleans HTML fed in chunks, without building a document tree: scripts, styles,
+    comments and attributes are removed, an element whose only child is an element of
+    the same name is merged into it, and empty elements are dropped.
+    Memory is bounded by the cleaned output and the depth of the open elements.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts: List[str] = []
+        self._stack: List[_OpenElement] = []
+        self._skip_depth = 0
+        # Characters of cleaned output so far
+        self.size = 0
+
+    def _write(self, text: str):
+        self._parts.append(text)
+        self.size += len(text)
+
+    def _emit_pending(self):
+        for element in self._stack:
+            if not element.emitted:
+                element.emitted = True
+                if element.wraps_same_name:
+                    element.slot = len(self._parts)
+                    self._parts.append("")
+                else:
+                    self._write(f"<{element.name}>")
+
+    def _close(self, element: _OpenElement):
+        if not element.emitted:
+            return
+        if element.slot is not None:
+            if element.children == 1:
+                # Merged into its only child, whose tags are kept
+                return
+            self._parts[element.slot] = f"<{element.name}>"
+            self.size += len(self._parts[element.slot])
+        self._write(f"</{element.name}>")
+
+    def _add_child(self, tag: Optional[str] = None):
+        parent = self._stack[-1] if self._stack else None
+        if parent is None:
+            return
+        if tag is None:
+            # Consecutive data of a text run is a single node
+            if parent.in_text:
+                return
+            parent.in_text = True
+        else:
+            parent.in_text = False
+        parent.children += 1
+        if parent.children == 1 and tag == parent.name:
+            parent.wraps_same_name = True
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_depth or tag in SKIPPED_ELEMENTS:
+            self._skip_depth += tag in SKIPPED_ELEMENTS
+            return
+        self._add_child(tag)
+        if tag in VOID_ELEMENTS:
+            return
+        self._stack.append(_OpenElement(tag))
+
+    def handle_decl(self, decl):
+        self._write(f"<!{decl}>")
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing elements have no content, but still are content of their parent
+        if not self._skip_depth and tag not in SKIPPED_ELEMENTS:
+            self._add_child(tag)
+
+    def handle_endtag(self, tag):
+        if self._skip_depth:
+            self._skip_depth -= tag in SKIPPED_ELEMENTS
+            return
+        if not any(element.name == tag for element in self._stack):
+            return
+        # Unclosed elements inside the closed one end with it
+        while self._stack:
+            element = self._stack.pop()
+            self._close(element)
+            if element.name == tag:
+                break
+        if self._stack:
+            self._stack[-1].in_text = False
+
+    def handle_data(self, data):
+        if self._skip_depth or not data:
+            return
+        self._add_child()
+        self._emit_pending()
+        self._write(escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self._stack:
+            self._close(self._stack.pop())
+
+    def get_cleaned_html(self) -> str:
+        return "".join(self._parts)
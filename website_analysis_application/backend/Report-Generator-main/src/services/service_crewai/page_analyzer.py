@@ -0,0 +1,579 @@
+import codecs
+import io
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+from PIL import Image
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+from src.services.service_memory import (
+    track_allocation,
+    track_release,
+    track_truncation,
+)
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+MAX_CONCURRENT_FETCHES = 8
+MAX_SUBRESOURCES = 100
+REQUEST_TIMEOUT = 10.0
+# Subresource bodies are streamed and discarded, only counting their bytes up to this
+# size; images keep their first bytes, which hold the dimensions Pillow reads
+MAX_SUBRESOURCE_BYTES = 10 * 1024 * 1024
+IMAGE_HEADER_BYTES = 64 * 1024
+
+# Thresholds taken from the corresponding Lighthouse audits
+TOTAL_BYTE_WEIGHT_BUDGET = 1600 * 1024
+TEXT_COMPRESSION_MIN_BYTES = 1400
+LONG_CACHE_TTL_SECONDS = 30 * 24 * 3600
+SERVER_RESPONSE_TIME_BUDGET = 0.6
+DOM_SIZE_BUDGET = 1500
+OVERSIZED_IMAGE_RATIO = 2
+
+TEXT_CONTENT_TYPES = ("text/", "javascript", "json", "xml", "svg")
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class FetchedResource:
+    """
+    What the audits need of a fetched document or subresource, without its body.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        status_code: int,
+        headers: httpx.Headers,
+        transfer_size: int,
+        head: bytes = b"",
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.transfer_size = transfer_size
+        # First bytes of the decoded body, kept for images only
+        self.head = head
+
+    @property
+    def is_success(self) -> bool:
+        return 200 <= self.status_code < 300
+
+
+class LocalPageAnalyzer:
+    """
+    Fetches a page and its subresources directly and computes page-weight,
+    caching, compression and render-blocking findings.
+    Used when PageSpeed Insights is slow or over quota; the results have the
+    same shape as PageSpeedInsightsTool._extract_relevant_data.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def analyze(self) -> Dict[str, dict]:
+        """
+        Returns the findings for every PageSpeed Insights category.
+        """
+        fetch_time = datetime.now(timezone.utc).isoformat()
+        with httpx.Client(
+            follow_redirects=True,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONCURRENT_FETCHES),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        ) as client:
+            started_at = time.monotonic()
+            document, html = self._fetch_document(client)
+            response_time = time.monotonic() - started_at
+
+            soup = BeautifulSoup(html, "html.parser")
+            subresources = self._find_subresources(soup, document.url)
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES) as executor:
+                responses = list(
+                    executor.map(
+                        lambda resource: self._fetch(client, resource), subresources
+                    )
+                )
+
+        for resource, response in zip(subresources, responses):
+            resource["response"] = response
+        track_allocation(
+            "analyzer",
+            len(html) + sum(len(response.head) for response in responses if response),
+        )
+        try:
+            return self._analyze_page(
+                document, html, soup, subresources, response_time, fetch_time
+            )
+        finally:
+            track_release("analyzer")
+
+    def _analyze_page(
+        self,
+        document: FetchedResource,
+        html: str,
+        soup: BeautifulSoup,
+        subresources: List[dict],
+        response_time: float,
+        fetch_time: str,
+    ) -> Dict[str, dict]:
+        """
+        Computes the findings of every category from the fetched page and subresources.
+        """
+        audits = {
+            "PERFORMANCE": [
+                self._audit_server_response_time(document, response_time),
+                self._audit_total_byte_weight(document, subresources),
+                self._audit_render_blocking(soup, document.url),
+                self._audit_text_compression(document, subresources),
+                self._audit_cache_ttl(subresources),
+                self._audit_image_sizes(subresources),
+                self._audit_unsized_images(soup),
+                self._audit_dom_size(soup),
+                self._audit_resource_summary(document, subresources),
+            ],
+            "ACCESSIBILITY": [
+                self._audit_image_alt(soup),
+                self._audit_html_lang(soup),
+                self._audit_document_title(soup),
+            ],
+            "BEST_PRACTICES": [
+                self._audit_https(document, subresources),
+                self._audit_doctype(html),
+                self._audit_charset(document, soup),
+            ],
+            "SEO": [
+                self._audit_http_status(document),
+                self._audit_document_title(soup),
+                self._audit_meta_description(soup),
+                self._audit_viewport(soup),
+                self._audit_image_alt(soup),
+            ],
+        }
+
+        return {
+            category: {
+                "requested_url": self.url,
+                "final_url": document.url,
+                "fetch_time": fetch_time,
+                "score": self._category_score(category_audits),
+                "audits": category_audits,
+                "source": "local",
+            }
+            for category, category_audits in audits.items()
+        }
+
+    def _fetch_document(self, client: httpx.Client) -> Tuple[FetchedResource, str]:
+        """
+        Streams the page up to JINA_MAX_BYTES, like the Jina AI formats, decoding it
+        incrementally. Larger pages are analyzed from their beginning.
+        """
+        with client.stream("GET", self.url) as response:
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(
+                errors="replace"
+            )
+            parts = []
+            size = 0
+            # Counts the decompressed bytes, which a compressed page can multiply
+            for chunk in response.iter_bytes():
+                chunk = chunk[: settings.JINA_MAX_BYTES - size]
+                size += len(chunk)
+                parts.append(decoder.decode(chunk))
+                if size >= settings.JINA_MAX_BYTES:
+                    logger.warning(
+                        f"Local analysis of {self.url} truncated the page at "
+                        f"{size} bytes"
+                    )
+                    track_truncation("analyzer")
+                    break
+            parts.append(decoder.decode(b"", final=True))
+            document = FetchedResource(
+                str(response.url),
+                response.status_code,
+                response.headers,
+                response.num_bytes_downloaded,
+            )
+        return document, "".join(parts)
+
+    @staticmethod
+    def _fetch(client: httpx.Client, resource: dict) -> Optional[FetchedResource]:
+        """
+        Streams a subresource, counting its transfer size without holding its body.
+        """
+        head_size = IMAGE_HEADER_BYTES if resource["type"] == "image" else 0
+        head = bytearray()
+        try:
+            with client.stream("GET", resource["url"]) as response:
+                for chunk in response.iter_bytes():
+                    if len(head) < head_size:
+                        head += chunk[: head_size - len(head)]
+                    if response.num_bytes_downloaded >= MAX_SUBRESOURCE_BYTES:
+                        break
+                content_length = response.headers.get("content-length", "")
+                return FetchedResource(
+                    str(response.url),
+                    response.status_code,
+                    response.headers,
+                    max(
+                        response.num_bytes_downloaded,
+                        int(content_length) if content_length.isdigit() else 0,
+                    ),
+                    bytes(head),
+                )
+        except httpx.HTTPError as e:
+            logger.debug(f"Failed to fetch subresource {resource['url']}: {e}")
+            return None
+
+    @staticmethod
+    def _find_subresources(soup: BeautifulSoup, base_url: str) -> List[dict]:
+        resources = []
+        seen = set()
+
+        def add(url: Optional[str], resource_type: str, tag=None):
+            if not url or url.startswith("data:"):
+                return
+            absolute_url = urljoin(base_url, url)
+            if (
+                urlparse(absolute_url).scheme not in ("http", "https")
+                or absolute_url in seen
+            ):
+                return
+            seen.add(absolute_url)
+            resources.append({"url": absolute_url, "type": resource_type, "tag": tag})
+
+        for link in soup.find_all("link", href=True):
+            if "stylesheet" in (link.get("rel") or []):
+                add(link["href"], "stylesheet", link)
+        for script in soup.find_all("script", src=True):
+            add(script["src"], "script", script)
+        for img in soup.find_all("img", src=True):
+            add(img["src"], "image", img)
+
+        return resources[:MAX_SUBRESOURCES]
+
+    @staticmethod
+    def _audit(
+        audit_id: str,
+        title: str,
+        description: str,
+        score,
+        display_value: str,
+        details=None,
+    ) -> dict:
+        audit = {
+            "id": audit_id,
+            "title": title,
+            "description": description,
+            "score": score,
+            "displayValue": display_value,
+        }
+        if details:
+            audit["details"] = details
+        return audit
+
+    @staticmethod
+    def _category_score(audits: List[dict]) -> Optional[float]:
+        scores = [audit["score"] for audit in audits if audit["score"] is not None]
+        return round(sum(scores) / len(scores), 2) if scores else None
+
+    @staticmethod
+    def _is_text(response: FetchedResource) -> bool:
+        content_type = response.headers.get("content-type", "")
+        return any(text_type in content_type for text_type in TEXT_CONTENT_TYPES)
+
+    def _audit_server_response_time(
+        self, document: FetchedResource, response_time: float
+    ) -> dict:
+        return self._audit(
+            "server-response-time",
+            "Initial server response time",
+            "Time taken to download the main document, redirects included.",
+            1 if response_time <= SERVER_RESPONSE_TIME_BUDGET else 0,
+            f"{response_time * 1000:.0f} ms",
+        )
+
+    def _audit_total_byte_weight(
+        self, document: FetchedResource, subresources: List[dict]
+    ) -> dict:
+        sizes = [(document.url, document.transfer_size)] + [
+            (resource["url"], resource["response"].transfer_size)
+            for resource in subresources
+            if resource["response"] is not None
+        ]
+        total = sum(size for _, size in sizes)
+        largest = sorted(sizes, key=lambda item: item[1], reverse=True)[:5]
+        return self._audit(
+            "total-byte-weight",
+            "Avoid enormous network payloads",
+            "Total transfer size of the document, stylesheets, scripts and images.",
+            round(min(1, TOTAL_BYTE_WEIGHT_BUDGET / total), 2) if total else 1,
+            f"Total size was {total / 1024:.0f} KiB",
+            [{"url": url, "transferSize": size} for url, size in largest],
+        )
+
+    def _audit_render_blocking(self, soup: BeautifulSoup, base_url: str) -> dict:
+        head = soup.head or soup
+        blocking = []
+        for link in head.find_all("link", href=True):
+            media = link.get("media", "all")
+            if "stylesheet" in (link.get("rel") or []) and media in (
+                "all",
+                "screen",
+                "",
+            ):
+                blocking.append(
+                    {"url": urljoin(base_url, link["href"]), "type": "stylesheet"}
+                )
+        for script in head.find_all("script", src=True):
+            if (
+                not script.has_attr("async")
+                and not script.has_attr("defer")
+                and script.get("type") != "module"
+            ):
+                blocking.append(
+                    {"url": urljoin(base_url, script["src"]), "type": "script"}
+                )
+        return self._audit(
+            "render-blocking-resources",
+            "Eliminate render-blocking resources",
+            "Stylesheets and synchronous scripts in the head delay the first paint.",
+            1 if not blocking else 0,
+            f"{len(blocking)} render-blocking resources",
+            blocking,
+        )
+
+    def _audit_text_compression(
+        self, document: FetchedResource, subresources: List[dict]
+    ) -> dict:
+        responses = [document] + [
+            resource["response"]
+            for resource in subresources
+            if resource["response"] is not None
+        ]
+        uncompressed = [
+            {"url": response.url, "transferSize": response.transfer_size}
+            for response in responses
+            if self._is_text(response)
+            and "content-encoding" not in response.headers
+            and response.transfer_size >= TEXT_COMPRESSION_MIN_BYTES
+        ]
+        return self._audit(
+            "uses-text-compression",
+            "Enable text compression",
+            "Text-based resources should be served with gzip, deflate or brotli.",
+            1 if not uncompressed else 0,
+            f"{len(uncompressed)} uncompressed text resources",
+            uncompressed,
+        )
+
+    def _audit_cache_ttl(self, subresources: List[dict]) -> dict:
+        short_lived = []
+        for resource in subresources:
+            response = resource["response"]
+            if response is None:
+                continue
+            cache_control = response.headers.get("cache-control", "")
+            match = MAX_AGE_PATTERN.search(cache_control)
+            max_age = int(match.group(1)) if match else 0
+            if "no-store" in cache_control or max_age < LONG_CACHE_TTL_SECONDS:
+                short_lived.append(
+                    {"url": resource["url"], "cacheControl": cache_control or None}
+                )
+        return self._audit(
+            "uses-long-cache-ttl",
+            "Serve static assets with an efficient cache policy",
+            "Static resources should be cacheable for at least 30 days.",
+            round(1 - len(short_lived) / len(subresources), 2) if subresources else 1,
+            f"{len(short_lived)} resources found",
+            short_lived,
+        )
+
+    def _audit_image_sizes(self, subresources: List[dict]) -> dict:
+        oversized = []
+        for resource in subresources:
+            response = resource["response"]
+            if (
+                resource["type"] != "image"
+                or response is None
+                or not response.is_success
+            ):
+                continue
+            try:
+                with Image.open(io.BytesIO(response.head)) as image:
+                    intrinsic_width, intrinsic_height = image.size
+            except Exception:
+                continue
+            declared_width = resource["tag"].get("width", "")
+            if (
+                declared_width.isdigit()
+                and intrinsic_width > OVERSIZED_IMAGE_RATIO * int(declared_width)
+            ):
+                oversized.append(
+                    {
+                        "url": resource["url"],
+                        "intrinsicSize": f"{intrinsic_width}x{intrinsic_height}",
+                        "declaredWidth": int(declared_width),
+                    }
+                )
+        return self._audit(
+            "uses-responsive-images",
+            "Properly size images",
+            "Images much larger than their displayed size waste bandwidth.",
+            1 if not oversized else 0,
+            f"{len(oversized)} oversized images",
+            oversized,
+        )
+
+    def _audit_unsized_images(self, soup: BeautifulSoup) -> dict:
+        unsized = [
+            {"src": img.get("src")}
+            for img in soup.find_all("img")
+            if not (img.has_attr("width") and img.has_attr("height"))
+        ]
+        return self._audit(
+            "unsized-images",
+            "Image elements have explicit width and height",
+            "Explicit dimensions reduce layout shifts.",
+            1 if not unsized else 0,
+            f"{len(unsized)} images without dimensions",
+            unsized[:10],
+        )
+
+    def _audit_dom_size(self, soup: BeautifulSoup) -> dict:
+        element_count = len(soup.find_all(True))
+        return self._audit(
+            "dom-size",
+            "Avoids an excessive DOM size",
+            "A large DOM increases memory usage and style calculation time.",
+            1 if element_count <= DOM_SIZE_BUDGET else 0,
+            f"{element_count} elements",
+        )
+
+    def _audit_resource_summary(
+        self, document: FetchedResource, subresources: List[dict]
+    ) -> dict:
+        summary = {"document": {"count": 1, "transferSize": document.transfer_size}}
+        for resource in subresources:
+            entry = summary.setdefault(
+                resource["type"], {"count": 0, "transferSize": 0}
+            )
+            entry["count"] += 1
+            if resource["response"] is not None:
+                entry["transferSize"] += resource["response"].transfer_size
+        return self._audit(
+            "resource-summary",
+            "Keep request counts low and transfer sizes small",
+            "Number of requests and transfer size by resource type.",
+            None,
+            f"{1 + len(subresources)} requests",
+            [{"resourceType": key, **value} for key, value in summary.items()],
+        )
+
+    def _audit_image_alt(self, soup: BeautifulSoup) -> dict:
+        missing = [
+            {"src": img.get("src")}
+            for img in soup.find_all("img")
+            if not img.has_attr("alt")
+        ]
+        return self._audit(
+            "image-alt",
+            "Image elements have [alt] attributes",
+            "Informative elements should aim for short, descriptive alternate text.",
+            1 if not missing else 0,
+            f"{len(missing)} images without alt",
+            missing[:10],
+        )
+
+    def _audit_html_lang(self, soup: BeautifulSoup) -> dict:
+        has_lang = bool(soup.html and soup.html.get("lang"))
+        return self._audit(
+            "html-has-lang",
+            "<html> element has a [lang] attribute",
+            "The lang attribute lets screen readers announce text properly.",
+            1 if has_lang else 0,
+            "present" if has_lang else "missing",
+        )
+
+    def _audit_document_title(self, soup: BeautifulSoup) -> dict:
+        has_title = bool(soup.title and soup.title.get_text(strip=True))
+        return self._audit(
+            "document-title",
+            "Document has a <title> element",
+            "The title gives screen reader users an overview and drives search results.",
+            1 if has_title else 0,
+            "present" if has_title else "missing",
+        )
+
+    def _audit_meta_description(self, soup: BeautifulSoup) -> dict:
+        meta = soup.find("meta", attrs={"name": "description"})
+        has_description = bool(meta and meta.get("content", "").strip())
+        return self._audit(
+            "meta-description",
+            "Document has a meta description",
+            "Meta descriptions may be included in search results.",
+            1 if has_description else 0,
+            "present" if has_description else "missing",
+        )
+
+    def _audit_viewport(self, soup: BeautifulSoup) -> dict:
+        has_viewport = soup.find("meta", attrs={"name": "viewport"}) is not None
+        return self._audit(
+            "viewport",
+            'Has a <meta name="viewport"> tag',
+            "A viewport meta tag optimizes the page for mobile screens.",
+            1 if has_viewport else 0,
+            "present" if has_viewport else "missing",
+        )
+
+    def _audit_http_status(self, document: FetchedResource) -> dict:
+        return self._audit(
+            "http-status-code",
+            "Page has successful HTTP status code",
+            "Pages with unsuccessful status codes may not be indexed.",
+            1 if document.is_success else 0,
+            str(document.status_code),
+        )
+
+    def _audit_https(self, document: FetchedResource, subresources: List[dict]) -> dict:
+        insecure = [
+            {"url": url}
+            for url in [document.url] + [resource["url"] for resource in subresources]
+            if urlparse(url).scheme == "http"
+        ]
+        return self._audit(
+            "is-on-https",
+            "Uses HTTPS",
+            "All pages and their resources should be served over HTTPS.",
+            1 if not insecure else 0,
+            f"{len(insecure)} insecure requests",
+            insecure[:10],
+        )
+
+    def _audit_doctype(self, html: str) -> dict:
+        has_doctype = html.lstrip()[:15].lower().startswith("<!doctype html")
+        return self._audit(
+            "doctype",
+            "Page has the HTML doctype",
+            "Specifying a doctype prevents the browser from switching to quirks mode.",
+            1 if has_doctype else 0,
+            "present" if has_doctype else "missing",
+        )
+
+    def _audit_charset(self, document: FetchedResource, soup: BeautifulSoup) -> dict:
+        declared = "charset=" in document.headers.get("content-type", "") or (
+            soup.find("meta", charset=True) is not None
+        )
+        return self._audit(
+            "charset",
+            "Properly defines charset",
+            "A character encoding declaration is required in the header or the HTML.",
+            1 if declared else 0,
+            "declared" if declared else "missing",
+        )
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+from contextvars import ContextVar
+from itertools import combinations
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from src.services.service_crewai.compact_audits import compact_category_data
+from src.services.service_report_types import PSI_CATEGORIES
+
+MAX_HTML_CHARS = 30000
+
+# Order of the sections of every context, so the contexts of the specialists share
+# their longest possible prefix: the categories most agents use come first
+CONTEXT_SECTIONS = (
+    "PERFORMANCE",
+    "ACCESSIBILITY",
+    "BEST_PRACTICES",
+    "html",
+    "SEO",
+    "screenshot",
+)
+
+# Acquired inputs written into the context of each specialist agent: only those its
+# instructions use. The page text is searched with the page content search tool.
+AGENT_CONTEXT_INPUTS: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+    {
+        "frontend_specialist_Agent": (
+            "PERFORMANCE",
+            "ACCESSIBILITY",
+            "BEST_PRACTICES",
+            "html",
+        ),
+        "image_analysis_Agent": ("screenshot",),
+        "ui_ux_specialist_Agent": ("PERFORMANCE", "ACCESSIBILITY"),
+        "seo_specialist_Agent": ("PERFORMANCE", "SEO"),
+    }
+)
+
+# OpenAI only caches prompts of 1024 tokens or more (about 4 characters per token)
+MIN_CACHED_PREFIX_CHARS = 4096
+
+# Stop sequence required by crewai when a response template is set; never produced by the model.
+END_OF_RESPONSE = "<END_OF_RESPONSE>"
+
+SHARED_CONTEXT_HEADER = (
+    "You are part of a team auditing the website {url}.\n"
+    "The data acquired for this audit that your work needs is included below. "
+    "It is complete: use it directly and only call a tool if a section reports an error "
+    "or to get data that is not included.\n"
+)
+
+
+def _section(title: str, content) -> str:
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return f"\n## {title}\n{content}\n"
+
+
+def _truncate(content, max_chars: int):
+    if isinstance(content, str) and len(content) > max_chars:
+        return content[:max_chars] + "\n[truncated]"
+    return content
+
+
+def _build_section(
+    name: str, psi_data: Dict[str, dict], jina_data: Dict[str, object]
+) -> str:
+    if name in PSI_CATEGORIES:
+        return _section(
+            f"PageSpeed Insights {PSI_CATEGORIES[name]}",
+            compact_category_data(psi_data.get(name, {"error": "missing"})),
+        )
+    if name == "html":
+        return _section(
+            "Cleaned HTML", _truncate(jina_data.get("html"), MAX_HTML_CHARS)
+        )
+    return _section("Page Screenshot", jina_data.get("screenshot"))
+
+
+def build_shared_contexts(
+    url: str, psi_data: Dict[str, dict], jina_data: Dict[str, object]
+) -> Dict[str, str]:
+    """
+    Builds the site data prefix of each specialist agent of a job, by agent name.
+    A prefix is placed before any agent-specific instruction and is byte-for-byte
+    reproducible (no timestamps, sorted keys, sections in CONTEXT_SECTIONS order), so
+    the provider's automatic prompt caching serves the part agents have in common from
+    cache once it has been sent.
+    """
+    sections = {
+        name: _build_section(name, psi_data, jina_data) for name in CONTEXT_SECTIONS
+    }
+    header = SHARED_CONTEXT_HEADER.format(url=url)
+    return {
+        agent: "".join(
+            [header]
+            + [sections[name] for name in CONTEXT_SECTIONS if name in inputs]
+            + ["\n---\n"]
+        )
+        for agent, inputs in AGENT_CONTEXT_INPUTS.items()
+    }
+
+
+def warm_up_prefix(contexts: Iterable[str]) -> Optional[str]:
+    """
+    Returns the longest prefix shared by at least two of the contexts, to be cached
+    before the agents using them send their requests in parallel; None if it is too
+    short to be cached.
+    """
+    prefix = max(
+        (os.path.commonprefix(pair) for pair in combinations(set(contexts), 2)),
+        key=len,
+        default="",
+    )
+    return prefix if len(prefix) >= MIN_CACHED_PREFIX_CHARS else None
+
+
+def shared_context_templates(shared_context: str) -> dict:
+    """
+    Returns the crewai Agent template arguments putting the shared context first,
+    followed by the agent's own role, tools and task.
+    """
+    return {
+        "system_template": shared_context + "{{ .System }}",
+        "prompt_template": "{{ .Prompt }}",
+        "response_template": "{{ .Response }}" + END_OF_RESPONSE,
+    }
+
+
+class TokenUsage:
+    """
+    Token usage of the LLM requests of a job, read from each response, with the prompt
+    tokens served from the provider's prompt cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.successful_requests = 0
+
+    def add(self, usage):
+        """
+        Adds the usage of a litellm response (None when the provider sent none).
+        """
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._lock:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.cached_prompt_tokens += getattr(details, "cached_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            self.successful_requests += 1
+
+    def summary(self) -> dict:
+        """
+        Summarizes the usage with its prompt cache hit rate.
+        """
+        with self._lock:
+            return {
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "successful_requests": self.successful_requests,
+                "cache_hit_rate": (
+                    round(self.cached_prompt_tokens / self.prompt_tokens, 3)
+                    if self.prompt_tokens
+                    else 0.0
+                ),
+            }
+
+
+# Token usage of the job run by the current thread. Branch threads run in a copy of the
+# job's context, so their requests are added to the job's usage and no other.
+current_token_usage: ContextVar[Optional[TokenUsage]] = ContextVar(
+    "current_token_usage", default=None
+)
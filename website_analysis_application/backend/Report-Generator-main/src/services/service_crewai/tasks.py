@@ -1,126 +1,219 @@
-from typing import List
+from types import MappingProxyType
+from typing import Callable, Iterable, List, Mapping, Optional, Tuple
 
 from crewai import Task
 from src.services.service_crewai.agents import *
+from src.services.service_crewai.shared_context import AGENT_CONTEXT_INPUTS
+from src.services.service_report_types import (
+    ACQUIRED_INPUTS,
+    BRANCH_TOOL_INPUTS,
+    REPORT_TYPES,
+)
 
+# Tool giving a specialist task access to each acquired input
+INPUT_TOOLS: Mapping[str, object] = MappingProxyType(
+    {
+        "html": get_jina_ai_html,
+        "text": search_page_content,
+        "screenshot": get_jina_ai_screenshot,
+        "ACCESSIBILITY": get_page_speed_insights_accessibility,
+        "BEST_PRACTICES": get_page_speed_insights_best_practices,
+        "PERFORMANCE": get_page_speed_insights_performance,
+        "SEO": get_page_speed_insights_seo,
+    }
+)
 
-def create_tasks(agents: Dict[str, Agent], url: str) -> List[Task]:
 
-    frontend_analysis_task = Task(
-        description=(
-            f"Perform an in-depth technical analysis of the HTML, CSS, and JavaScript code of the {url} webpage. "
-            "Focus on identifying bugs, invalid HTML, missing semantic elements, outdated implementations, and performance bottlenecks. "
-            "Tools: PageSpeed Insights (Accessibility, Best Practices, Performance), Jina AI HTML Analysis."
-        ),
-        expected_output=(
-            "A brief technical summary of critical front-end issues: 1) Structural HTML errors, 2) CSS/JavaScript inefficiencies, "
-            "3) Non-compliance with modern standards. Include key recommendations for improvement."
-        ),
-        tools=[
-            get_page_speed_insights_accessibility,
-            get_page_speed_insights_best_practices,
-            get_page_speed_insights_performance,
-            get_jina_ai_html,
-        ],
-        agent=agents["frontend_specialist_Agent"],
-        async_execution=True,
-    )
-
-    frontend_report_task = Task(
-        description=(
-            f"Summarize the front-end analysis findings for {url}. Provide key issues, technical explanations, and a brief action plan. "
-            "Tools: Analysis context from Frontend Specialist Agent."
-        ),
-        expected_output=(
-            "Structured report: 1) Executive Summary, 2) Key Technical Issues, 3) Prioritized Action Plan. Keep details concise."
-        ),
-        agent=agents["frontend_report_analyst_Agent"],
-        context=[frontend_analysis_task],
-        output_file="frontend_report.md",
-    )
-
-    image_analysis_task = Task(
-        description=(
-            f"Analyze the visual design of the image assets on the {url} webpage. "
-            "Identify design inconsistencies and accessibility issues. "
-            "Tools: Jina AI Screenshot Analysis."
-        ),
-        expected_output=(
-            "Brief report on: 1) Design flaws, 2) Accessibility issues, 3) Key improvement suggestions."
-        ),
-        tools=[get_jina_ai_screenshot],
-        agent=agents["image_analysis_Agent"],
-        async_execution=True,
-    )
-
-    ui_ux_analysis_task = Task(
-        description=(
-            f"Evaluate the design, usability, accessibility, and responsiveness of the {url} webpage. "
-            "Focus on WCAG standards, media queries, and interactive components. "
-            "Tools: PageSpeed Insights (Accessibility, Performance), Jina AI Text Analysis."
-        ),
-        expected_output=(
-            "Brief technical summary: 1) Accessibility gaps, 2) Usability issues, 3) Non-responsive elements. Provide key recommendations."
+def _branch_tools(report_type: str) -> tuple:
+    return tuple(INPUT_TOOLS[name] for name in BRANCH_TOOL_INPUTS[report_type])
+
+
+# Immutable task definitions, in execution order, bound to each job's URL and agents.
+# Descriptions are formatted with the URL; context lists the tasks whose output is used.
+TASK_TEMPLATES: Mapping[str, Mapping] = MappingProxyType(
+    {
+        "frontend_analysis": MappingProxyType(
+            dict(
+                description=(
+                    "Perform an in-depth technical analysis of the HTML, CSS, and JavaScript code of the {url} webpage. "
+                    "Focus on identifying bugs, invalid HTML, missing semantic elements, outdated implementations, and performance bottlenecks. "
+                    "Tools: PageSpeed Insights (Accessibility, Best Practices, Performance), Jina AI HTML Analysis."
+                ),
+                expected_output=(
+                    "A brief technical summary of critical front-end issues: 1) Structural HTML errors, 2) CSS/JavaScript inefficiencies, "
+                    "3) Non-compliance with modern standards. Include key recommendations for improvement."
+                ),
+                tools=_branch_tools("frontend"),
+                agent="frontend_specialist_Agent",
+            )
         ),
-        tools=[
-            get_page_speed_insights_accessibility,
-            get_page_speed_insights_performance,
-            get_jina_ai_text,
-        ],
-        agent=agents["ui_ux_specialist_Agent"],
-        async_execution=True,
-    )
-
-    ui_ux_report_task = Task(
-        description=(
-            f"Summarize the UI/UX analysis for {url}. Provide key findings and prioritized recommendations. "
-            "Tools: Analysis context from UI/UX Specialist Agent and Image Analysis Agent."
+        "frontend_report": MappingProxyType(
+            dict(
+                description=(
+                    "Summarize the front-end analysis findings for {url}. Provide key issues, technical explanations, and a brief action plan. "
+                    "Tools: Analysis context from Frontend Specialist Agent."
+                ),
+                expected_output=(
+                    "Structured report: 1) Executive Summary, 2) Key Technical Issues, 3) Prioritized Action Plan. Keep details concise."
+                ),
+                agent="frontend_report_analyst_Agent",
+                context=("frontend_analysis",),
+            )
         ),
-        expected_output=(
-            "Structured report: 1) Summary of issues, 2) Key Technical Explanations, 3) Prioritized Action Plan."
+        "image_analysis": MappingProxyType(
+            dict(
+                description=(
+                    "Analyze the visual design of the image assets on the {url} webpage. "
+                    "Identify design inconsistencies and accessibility issues. "
+                    "Tools: Jina AI Screenshot Analysis."
+                ),
+                expected_output=(
+                    "Brief report on: 1) Design flaws, 2) Accessibility issues, 3) Key improvement suggestions."
+                ),
+                tools=(INPUT_TOOLS["screenshot"],),
+                agent="image_analysis_Agent",
+            )
         ),
-        context=[ui_ux_analysis_task, image_analysis_task],
-        agent=agents["ui_ux_report_analyst_Agent"],
-        output_file="ui_ux_report.md",
-    )
-
-    seo_analysis_task = Task(
-        description=(
-            f"Perform a technical SEO audit of the {url} webpage. "
-            "Focus on Core Web Vitals, structured data, indexing, and metadata optimization. "
-            "Tools: PageSpeed Insights (SEO, Performance), Jina AI Text Analysis."
+        "ui_ux_analysis": MappingProxyType(
+            dict(
+                description=(
+                    "Evaluate the design, usability, accessibility, and responsiveness of the {url} webpage. "
+                    "Focus on WCAG standards, media queries, and interactive components. "
+                    "Tools: PageSpeed Insights (Accessibility, Performance), Page Content Search."
+                ),
+                expected_output=(
+                    "Brief technical summary: 1) Accessibility gaps, 2) Usability issues, 3) Non-responsive elements. Provide key recommendations."
+                ),
+                tools=_branch_tools("ui_ux"),
+                agent="ui_ux_specialist_Agent",
+            )
         ),
-        expected_output=(
-            "Brief SEO summary: 1) Crawlability issues, 2) Metadata inefficiencies, 3) Structured data errors. Provide key recommendations."
+        "ui_ux_report": MappingProxyType(
+            dict(
+                description=(
+                    "Summarize the UI/UX analysis for {url}. Provide key findings and prioritized recommendations. "
+                    "Tools: Analysis context from UI/UX Specialist Agent and Image Analysis Agent."
+                ),
+                expected_output=(
+                    "Structured report: 1) Summary of issues, 2) Key Technical Explanations, 3) Prioritized Action Plan."
+                ),
+                context=(
+                    "ui_ux_analysis",
+                    "image_analysis",
+                ),
+                agent="ui_ux_report_analyst_Agent",
+            )
         ),
-        tools=[
-            get_page_speed_insights_seo,
-            get_page_speed_insights_performance,
-            get_jina_ai_text,
-        ],
-        agent=agents["seo_specialist_Agent"],
-        async_execution=True,
-    )
-
-    seo_report_task = Task(
-        description=(
-            f"Compile a concise SEO report summarizing findings for {url}. Include key recommendations for improvements. "
-            "Tools: Analysis context from SEO Specialist Agent and Image Analysis Agent."
+        "seo_analysis": MappingProxyType(
+            dict(
+                description=(
+                    "Perform a technical SEO audit of the {url} webpage. "
+                    "Focus on Core Web Vitals, structured data, indexing, and metadata optimization. "
+                    "Tools: PageSpeed Insights (SEO, Performance), Page Content Search."
+                ),
+                expected_output=(
+                    "Brief SEO summary: 1) Crawlability issues, 2) Metadata inefficiencies, 3) Structured data errors. Provide key recommendations."
+                ),
+                tools=_branch_tools("seo"),
+                agent="seo_specialist_Agent",
+            )
         ),
-        expected_output=(
-            "Structured report: 1) Summary of issues, 2) Key Technical Explanations, 3) Prioritized Action Plan."
+        "seo_report": MappingProxyType(
+            dict(
+                description=(
+                    "Compile a concise SEO report summarizing findings for {url}. Include key recommendations for improvements. "
+                    "Tools: Analysis context from SEO Specialist Agent and Image Analysis Agent."
+                ),
+                expected_output=(
+                    "Structured report: 1) Summary of issues, 2) Key Technical Explanations, 3) Prioritized Action Plan."
+                ),
+                context=(
+                    "seo_analysis",
+                    "image_analysis",
+                ),
+                agent="seo_report_analyst_Agent",
+            )
         ),
-        context=[seo_analysis_task, image_analysis_task],
-        agent=agents["seo_report_analyst_Agent"],
-        output_file="seo_report.md",
-    )
-
-    return [
-        frontend_analysis_task,
-        frontend_report_task,
-        image_analysis_task,
-        ui_ux_analysis_task,
-        ui_ux_report_task,
-        seo_analysis_task,
-        seo_report_task,
+    }
+)
+
+# Tasks of each report branch, in execution order and ending with its report task.
+# The image analysis task is shared by the UI/UX and SEO branches, and only needed by
+# their report tasks.
+BRANCH_TASKS = MappingProxyType(
+    {
+        "frontend": ("frontend_analysis", "frontend_report"),
+        "ui_ux": ("ui_ux_analysis", "image_analysis", "ui_ux_report"),
+        "seo": ("seo_analysis", "image_analysis", "seo_report"),
+    }
+)
+
+
+def _prompt_inputs(task_name: str) -> List[str]:
+    """
+    Returns the acquired inputs the prompt of a task includes: those of its tools (the
+    task's own, else its agent's, as crewai does) and those of its agent's shared
+    context.
+    """
+    template = TASK_TEMPLATES[task_name]
+    tools = template.get("tools") or AGENT_TEMPLATES[template["agent"]].get("tools", ())
+    inputs = [
+        name
+        for name, input_tool in INPUT_TOOLS.items()
+        if any(tool is input_tool for tool in tools)
     ]
+    inputs.extend(AGENT_CONTEXT_INPUTS.get(template["agent"], ()))
+    return inputs
+
+
+# Acquired inputs each report branch depends on, derived from the prompts of its tasks
+# (the tasks it gets as context being part of the branch)
+BRANCH_INPUTS: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+    {
+        report_type: tuple(
+            name
+            for name in ACQUIRED_INPUTS
+            if any(name in _prompt_inputs(task) for task in task_names)
+        )
+        for report_type, task_names in BRANCH_TASKS.items()
+    }
+)
+
+
+def create_tasks(
+    agents: Dict[str, Agent],
+    url: str,
+    report_types: Iterable[str] = REPORT_TYPES,
+    task_callback: Optional[Callable] = None,
+) -> Dict[str, List[Task]]:
+    """
+    Binds the task templates of the requested report branches to a job's URL and agents.
+    Every task is named after its template and calls task_callback with its output when
+    completed.
+
+    Returns:
+        dict: the tasks of each report branch, in execution order.
+    """
+    report_types = list(report_types)
+    needed = {
+        name for report_type in report_types for name in BRANCH_TASKS[report_type]
+    }
+
+    tasks = {}
+    for name, template in TASK_TEMPLATES.items():
+        if name not in needed:
+            continue
+        tasks[name] = Task(
+            name=name,
+            description=template["description"].format(url=url),
+            expected_output=template["expected_output"],
+            tools=list(template.get("tools", ())),
+            agent=agents[template["agent"]],
+            context=[tasks[context] for context in template.get("context", ())] or None,
+            callback=task_callback,
+        )
+
+    return {
+        report_type: [tasks[name] for name in BRANCH_TASKS[report_type]]
+        for report_type in report_types
+    }
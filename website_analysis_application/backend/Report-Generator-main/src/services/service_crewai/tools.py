@@ -1,16 +1,59 @@
+import codecs
+import json
+import re
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
+from typing import List, Optional
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup, Comment
 from crewai.tools import tool
 from markdown_pdf import MarkdownPdf, Section
 from src.config.settings import get_settings
 from src.logger.logger import get_logger
+from src.services.service_crewai.compact_audits import (
+    compact_category_data,
+    compact_details,
+    measure_token_reduction,
+)
+from src.services.service_cancel import raise_if_cancelled
+from src.services.service_crewai.html_cleaner import StreamingHTMLCleaner
+from src.services.service_crewai.page_analyzer import LocalPageAnalyzer
+from src.services.service_memory import (
+    track_allocation,
+    track_release,
+    track_truncation,
+)
+from src.services.service_profiler import profiled
+from src.services.service_rate_limit import rate_limited_get
+from src.services.service_report_types import PSI_CATEGORIES
+from src.services.service_state import get_or_fetch
 from tqdm import tqdm
 
 settings = get_settings()
 logger = get_logger(__file__)
 
+JINA_CHUNK_SIZE = 64 * 1024
+
+# Page text retrieval: characters per indexed chunk, overlap between chunks, chunks returned
+RETRIEVAL_CHUNK_SIZE = 1000
+RETRIEVAL_CHUNK_OVERLAP = 150
+RETRIEVAL_TOP_K = 4
+
+
+def _is_cacheable(data: dict) -> bool:
+    """
+    Tells whether every part of the acquired data was fetched from the upstream, i.e. can be cached.
+    Failed fetches and local fallback results are retried on the next job.
+    """
+    return not any(
+        isinstance(value, dict) and ("error" in value or value.get("source") == "local")
+        for value in data.values()
+    )
+
 
 def from_md_to_pdf(input_path: str, output_path: str):
     with open(input_path, "r") as file:
@@ -20,17 +63,87 @@ def from_md_to_pdf(input_path: str, output_path: str):
     pdf.save(output_path)
 
 
+def normalize_url(url: str) -> str:
+    """
+    Normalizes the variants of a URL agents may write (host case, default port,
+    trailing slash, fragment), so they map to the same tool instance.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower() or "https"
+    host = (parsed.hostname or "").lower()
+    if parsed.port and (scheme, parsed.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parsed.port}"
+    path = parsed.path.rstrip("/") or "/"
+    query = f"?{parsed.query}" if parsed.query else ""
+    return f"{scheme}://{host}{path}{query}"
+
+
+# Tool instances of the job run by the current thread, by class and normalized URL.
+# Branch threads run in a copy of the job's context, so they share its registry.
+current_tool_registry: ContextVar[Optional[dict]] = ContextVar(
+    "current_tool_registry", default=None
+)
+
+
 class SingletonMeta(type):
     """
     A metaclass for creating Singleton classes.
+    One instance is kept per class and normalized URL, in the registry of the current job
+    (of the process outside jobs), so concurrent jobs on the same URL never release each
+    other's instances. Data tools can be given their data, e.g. restored from a
+    checkpoint, instead of fetching it.
     """
 
     _instances = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _registry() -> dict:
+        registry = current_tool_registry.get()
+        return SingletonMeta._instances if registry is None else registry
+
+    def __call__(cls, url: str, *args):
+        registry = SingletonMeta._registry()
+        key = (cls, normalize_url(url))
+        with SingletonMeta._lock:
+            instance = registry.get(key)
+        if instance is not None:
+            return instance
+
+        instance = super().__call__(url, *args)
+        with SingletonMeta._lock:
+            existing = registry.setdefault(key, instance)
+        if existing is not instance:
+            # Built concurrently by another thread of the job
+            _close(instance)
+        return existing
+
+    def release(cls, url: str):
+        """
+        Drops the cached instance so the next call fetches fresh data.
+        """
+        with SingletonMeta._lock:
+            instance = SingletonMeta._registry().pop((cls, normalize_url(url)), None)
+        _close(instance)
+
+
+def _close(instance):
+    if instance is not None and hasattr(instance, "close"):
+        instance.close()
+
 
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super().__call__(*args, **kwargs)
-        return cls._instances[cls]
+def release_tool_registry(registry: dict):
+    """
+    Releases every tool instance a job created, including those for URL variants.
+    """
+    with SingletonMeta._lock:
+        instances = list(registry.values())
+        registry.clear()
+    for instance in instances:
+        try:
+            _close(instance)
+        except Exception as e:
+            logger.error(f"Releasing {type(instance).__name__} failed: {e}")
 
 
 # PageSpeedInsights Singleton class
@@ -40,32 +153,126 @@ class PageSpeedInsightsTool(metaclass=SingletonMeta):
     Fetches data for all categories once, then extracts and stores relevant data.
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, data: Optional[dict] = None):
         if not hasattr(self, "_data_fetched"):
             self.url = url
             self.api_key = settings.PAGESPEED_INSIGHTS_API_KEY
             self._data_fetched = True
-            self._fetch_and_process_data()
+            self.data = data or get_or_fetch(
+                "psi",
+                url,
+                self._fetch_and_process_data,
+                ttl=settings.ACQUISITION_CACHE_TTL,
+                should_cache=_is_cacheable,
+            )
+            track_allocation("psi", len(json.dumps(self.data)))
+
+    def close(self):
+        track_release("psi")
+
+    def _fetch_and_process_data(self) -> dict:
+        """
+        Fetches the data of all categories in parallel and extracts the information for LLMs.
+        If PageSpeed Insights has not delivered every category within PSI_FALLBACK_AFTER
+        seconds, the page is analyzed locally meanwhile, and the categories PSI still
+        failed or has not delivered once that is done are replaced by the local findings.
+        """
+        categories = list(PSI_CATEGORIES)
+        # Not waited for on exit: late PSI answers and local analyses finish in the background
+        executor = ThreadPoolExecutor(max_workers=len(categories) + 1)
+        try:
+            futures = {
+                category: executor.submit(
+                    copy_context().run, profiled(self._fetch_category, "psi"), category
+                )
+                for category in categories
+            }
+            wait(futures.values(), timeout=settings.PSI_FALLBACK_AFTER)
+            local_analysis = None
+            if not all(
+                future.done() and "error" not in future.result()
+                for future in futures.values()
+            ):
+                local_analysis = executor.submit(
+                    copy_context().run,
+                    profiled(self._analyze_locally, "local_analysis"),
+                )
+                while not local_analysis.done() and not all(
+                    future.done() for future in futures.values()
+                ):
+                    wait(
+                        [local_analysis, *futures.values()],
+                        return_when=FIRST_COMPLETED,
+                    )
+        finally:
+            executor.shutdown(wait=False)
+
+        data = {
+            category: (
+                future.result()
+                if future.done()
+                else {
+                    "error": f"No {category} data before the local analysis completed"
+                }
+            )
+            for category, future in futures.items()
+        }
+        failed_categories = [
+            category for category in categories if "error" in data[category]
+        ]
+        if failed_categories:
+            logger.warning(
+                f"PageSpeed Insights failed for {failed_categories}, "
+                f"using the local analysis of {self.url}"
+            )
+            local_data = local_analysis.result()
+            if local_data is not None:
+                for category in failed_categories:
+                    data[category] = {
+                        **local_data[category],
+                        "psi_error": data[category]["error"],
+                    }
+
+        return data
 
-    def _fetch_and_process_data(self):
+    def _fetch_category(self, category: str) -> dict:
         """
-        Fetches data for all categories and extracts necessary information for LLMs.
+        Fetches the data of one category from PageSpeed Insights.
         """
         api_url = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
-        params = {"key": self.api_key, "strategy": "desktop", "url": self.url}
-
-        categories = ["ACCESSIBILITY", "BEST_PRACTICES", "PERFORMANCE", "SEO"]
-        self.data = {}
+        params = {
+            "key": self.api_key,
+            "strategy": "desktop",
+            "url": self.url,
+            "category": category,
+        }
+        try:
+            response = rate_limited_get(
+                "psi",
+                self.api_key,
+                api_url,
+                params=params,
+                timeout=settings.PSI_TIMEOUT,
+            )
+            response.raise_for_status()
+            category_data = self._extract_relevant_data(response.json(), category)
+        except requests.RequestException as e:
+            return {"error": f"Failed to fetch {category} data: {e}"}
+        logger.info(
+            f"PSI {category} payload for {self.url}: "
+            f"{measure_token_reduction(category_data)}"
+        )
+        return category_data
 
-        for category in categories:
-            params["category"] = category
-            try:
-                response = requests.get(api_url, params=params)
-                response.raise_for_status()
-                raw_data = response.json()
-                self.data[category] = self._extract_relevant_data(raw_data, category)
-            except requests.RequestException as e:
-                self.data[category] = {"error": f"Failed to fetch {category} data: {e}"}
+    def _analyze_locally(self) -> Optional[dict]:
+        """
+        Returns the local findings for every category, or None if the analysis failed.
+        """
+        try:
+            return LocalPageAnalyzer(self.url).analyze()
+        except Exception as e:
+            logger.error(f"Local page analysis of {self.url} failed: {e}")
+            return None
 
     def _extract_relevant_data(self, raw_data, category):
         """
@@ -99,6 +306,10 @@ class PageSpeedInsightsTool(metaclass=SingletonMeta):
                         "title": audit.get("title"),
                         "description": audit.get("description"),
                         "score": audit.get("score"),
+                        "weight": ref.get("weight"),
+                        "numericValue": audit.get("numericValue"),
+                        "displayValue": audit.get("displayValue"),
+                        "details": compact_details(audit.get("details")),
                     }
                 )
 
@@ -110,6 +321,12 @@ class PageSpeedInsightsTool(metaclass=SingletonMeta):
         """
         return self.data.get(category, {"error": "Category not found."})
 
+    def get_compact_category_data(self, category: str):
+        """
+        Returns the failing audits of the specified category in the compact encoding sent to agents.
+        """
+        return compact_category_data(self.get_category_data(category))
+
 
 @tool("Page Speed Insights Accessibility")
 def get_page_speed_insights_accessibility(url: str) -> dict:
@@ -120,10 +337,10 @@ def get_page_speed_insights_accessibility(url: str) -> dict:
         url (str): The URL to analyze.
 
     Returns:
-        dict: Processed Accessibility data or error information.
+        dict: Failing Accessibility audits in compact form, or error information.
     """
     tool = PageSpeedInsightsTool(url)
-    return tool.get_category_data("ACCESSIBILITY")
+    return tool.get_compact_category_data("ACCESSIBILITY")
 
 
 @tool("Page Speed Insights Best Practices")
@@ -135,10 +352,10 @@ def get_page_speed_insights_best_practices(url: str) -> dict:
         url (str): The URL to analyze.
 
     Returns:
-        dict: Processed Best Practices data or error information.
+        dict: Failing Best Practices audits in compact form, or error information.
     """
     tool = PageSpeedInsightsTool(url)
-    return tool.get_category_data("BEST_PRACTICES")
+    return tool.get_compact_category_data("BEST_PRACTICES")
 
 
 @tool("Page Speed Insights Performance")
@@ -150,10 +367,10 @@ def get_page_speed_insights_performance(url: str) -> dict:
         url (str): The URL to analyze.
 
     Returns:
-        dict: Processed Performance data or error information.
+        dict: Failing Performance audits in compact form, or error information.
     """
     tool = PageSpeedInsightsTool(url)
-    return tool.get_category_data("PERFORMANCE")
+    return tool.get_compact_category_data("PERFORMANCE")
 
 
 @tool("Page Speed Insights SEO")
@@ -165,10 +382,10 @@ def get_page_speed_insights_seo(url: str) -> dict:
         url (str): The URL to analyze.
 
     Returns:
-        dict: Processed SEO data or error information.
+        dict: Failing SEO audits in compact form, or error information.
     """
     tool = PageSpeedInsightsTool(url)
-    return tool.get_category_data("SEO")
+    return tool.get_compact_category_data("SEO")
 
 
 # JinaAI Singleton class
@@ -178,14 +395,27 @@ class JinaAITool(metaclass=SingletonMeta):
     Fetches data for all formats once, then serves the data on future calls.
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, data: Optional[dict] = None):
         if not hasattr(self, "_data_fetched"):
             self.url = url
             self.api_key = settings.JINA_AI_API_KEY
             self._data_fetched = True
-            self._fetch_all_data()
-
-    def _fetch_all_data(self):
+            self.data = data or get_or_fetch(
+                "jina",
+                url,
+                self._fetch_all_data,
+                ttl=settings.ACQUISITION_CACHE_TTL,
+                should_cache=_is_cacheable,
+            )
+            for fmt, value in self.data.items():
+                if isinstance(value, str):
+                    track_allocation(f"jina:{fmt}", len(value))
+
+    def close(self):
+        for fmt in self.data:
+            track_release(f"jina:{fmt}")
+
+    def _fetch_all_data(self) -> dict:
         """
         Fetches data for all formats and stores it in instance variables.
         Cleans the HTML data if fetched.
@@ -197,48 +427,67 @@ class JinaAITool(metaclass=SingletonMeta):
             "text": {"X-Retain-Images": "none", "X-Return-Format": "text"},
             "screenshot": {"X-Return-Format": "screenshot"},
         }
-        self.data = {}
+        data = {}
 
         for fmt, extra_headers in formats.items():
             try:
                 headers.update(extra_headers)
-                response = requests.get(f"{base_url}{self.url}", headers=headers)
-                response.raise_for_status()
-                self.data[fmt] = (
-                    self._clean_html(response.text) if fmt == "html" else response.text
+                response = rate_limited_get(
+                    "jina",
+                    self.api_key,
+                    f"{base_url}{self.url}",
+                    headers=headers,
+                    stream=True,
+                    timeout=settings.JINA_TIMEOUT,
                 )
+                with response:
+                    response.raise_for_status()
+                    data[fmt] = self._read_limited(response, fmt)
             except requests.RequestException as e:
-                self.data[fmt] = {"error": f"Failed to fetch {fmt} data: {e}"}
+                data[fmt] = {"error": f"Failed to fetch {fmt} data: {e}"}
 
-    @staticmethod
-    def _clean_html(html_content: str) -> str:
+        return data
+
+    def _read_limited(self, response: requests.Response, fmt: str) -> str:
         """
-        Cleans the fetched HTML content by removing unnecessary details.
+        Reads a streamed response up to JINA_MAX_BYTES, decoding it incrementally.
+        HTML is cleaned as it arrives, so the raw page is never held in full.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
-
-        # Remove script and style elements
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.decompose()
-
-        # Remove comments
-        for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
-            comment.extract()
-
-        # Clear tag attributes
-        for tag in soup.find_all(True):
-            tag.attrs = {}
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(
+            errors="replace"
+        )
+        cleaner = StreamingHTMLCleaner() if fmt == "html" else None
+        parts = []
+        size = 0
+        downloaded = 0
+
+        for chunk in response.iter_content(chunk_size=JINA_CHUNK_SIZE):
+            raise_if_cancelled()
+            chunk = chunk[: settings.JINA_MAX_BYTES - downloaded]
+            downloaded += len(chunk)
+            text = decoder.decode(chunk)
+            if cleaner is not None:
+                cleaner.feed(text)
+                size = cleaner.size
+            else:
+                parts.append(text)
+                size += len(text)
+            track_allocation(f"jina:{fmt}", size)
+            if downloaded >= settings.JINA_MAX_BYTES:
+                logger.warning(
+                    f"Jina AI {fmt} of {self.url} truncated at {downloaded} bytes"
+                )
+                track_truncation(f"jina:{fmt}")
+                break
 
-        # Merge nested tags and remove empty tags
-        for tag in soup.find_all():
-            # Merge nested tags
-            while len(tag.contents) == 1 and tag.contents[0].name == tag.name:
-                tag.unwrap()
-            # Remove empty tags
-            if not tag.contents and (tag.string is None or not tag.string.strip()):
-                tag.decompose()
+        text = decoder.decode(b"", final=True)
+        if cleaner is None:
+            parts.append(text)
+            return "".join(parts)
 
-        return str(soup)
+        cleaner.feed(text)
+        cleaner.close()
+        return cleaner.get_cleaned_html()
 
     def get_html(self) -> str:
         """
@@ -259,6 +508,107 @@ class JinaAITool(metaclass=SingletonMeta):
         return self.data.get("screenshot", {"error": "Screenshot data not available."})
 
 
+def _chunk_text(text: str) -> List[str]:
+    """
+    Splits text into chunks of about RETRIEVAL_CHUNK_SIZE characters, on paragraph and
+    line boundaries when possible, each starting with the end of the previous one.
+    """
+    pieces = []
+    for piece in re.split(r"\n\s*\n|\n", text):
+        piece = piece.strip()
+        while len(piece) > RETRIEVAL_CHUNK_SIZE:
+            pieces.append(piece[:RETRIEVAL_CHUNK_SIZE])
+            piece = piece[RETRIEVAL_CHUNK_SIZE - RETRIEVAL_CHUNK_OVERLAP :]
+        if piece:
+            pieces.append(piece)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > RETRIEVAL_CHUNK_SIZE:
+            chunks.append(current)
+            overlap = current[-RETRIEVAL_CHUNK_OVERLAP:]
+            current = (
+                overlap if len(overlap) + len(piece) < RETRIEVAL_CHUNK_SIZE else ""
+            )
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@lru_cache(maxsize=None)
+def _get_vector_store():
+    """Function to get and cache the in-process chromadb client holding the page indexes."""
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+
+    return chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False))
+
+
+class PageContentIndex(metaclass=SingletonMeta):
+    """
+    Singleton in-process vector index of the page text, one collection per analyzed URL.
+    Chunks are embedded with chromadb's local embedding model (all-MiniLM-L6-v2 on
+    onnxruntime), so agents retrieve the sections relevant to a question instead of
+    reading the whole page. The collection is deleted when the index is released.
+    """
+
+    def __init__(self, url: str):
+        if not hasattr(self, "_data_fetched"):
+            self.url = url
+            self._data_fetched = True
+            self.chunk_count = 0
+            # Characters of the indexed chunks
+            self.size = 0
+            self.collection = None
+            self.add_page(url, JinaAITool(url).get_text())
+
+    def add_page(self, page_url: str, text):
+        """
+        Indexes the text of a page. Other pages of the site (e.g. crawled ones) can be
+        added to the same index.
+        """
+        if not isinstance(text, str) or not text.strip():
+            return
+        chunks = _chunk_text(text)
+        if self.collection is None:
+            self.collection = _get_vector_store().create_collection(
+                f"page_{uuid.uuid4().hex}"
+            )
+        self.collection.add(
+            ids=[str(self.chunk_count + index) for index in range(len(chunks))],
+            documents=chunks,
+            metadatas=[{"url": page_url} for _ in chunks],
+        )
+        self.chunk_count += len(chunks)
+        self.size += sum(len(chunk) for chunk in chunks)
+        track_allocation("index", self.size)
+        logger.info(f"Indexed {len(chunks)} chunks of {page_url}")
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> List[dict]:
+        """
+        Returns the chunks most relevant to the query, most relevant first.
+        """
+        if self.collection is None:
+            return []
+        results = self.collection.query(
+            query_texts=[query], n_results=min(top_k, self.chunk_count)
+        )
+        return [
+            {"url": metadata["url"], "text": document}
+            for document, metadata in zip(
+                results["documents"][0], results["metadatas"][0]
+            )
+        ]
+
+    def close(self):
+        track_release("index")
+        if self.collection is not None:
+            _get_vector_store().delete_collection(self.collection.name)
+            self.collection = None
+
+
 @tool("Jina AI HTML Format")
 def get_jina_ai_html(url: str) -> str:
     """
@@ -304,6 +654,29 @@ def get_jina_ai_screenshot(url: str) -> str:
     return tool.get_screenshot()
 
 
+@tool("Page Content Search")
+def search_page_content(url: str, query: str) -> dict:
+    """
+    Searches the text of the page for the passages relevant to a query, such as
+    "meta tags", "navigation" or "call to action".
+
+    Args:
+        url (str): The URL of the analyzed page.
+        query (str): What to look for in the page content.
+
+    Returns:
+        dict: The most relevant passages of the page text, or error information.
+    """
+    try:
+        chunks = PageContentIndex(url).search(query)
+    except Exception as e:
+        logger.error(f"Page content search failed for {url}: {e}")
+        return {"error": f"Page content search unavailable: {e}"}
+    if not chunks:
+        return {"error": "The page text is not available."}
+    return {"url": url, "query": query, "passages": chunks}
+
+
 # def is_same_domain(base_url, new_url):
 #     base_domain = urlparse(base_url).netloc
 #     new_domain = urlparse(new_url).netloc
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import re
+import time
+import zipfile
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi.responses import FileResponse, Response
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+from starlette.datastructures import Headers
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+OUTPUTS_DIR = os.path.abspath(settings.OUTPUTS_DIR)
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Each run of a job writes a new version of its reports, never changed once published,
+# so clients and CDNs may keep the reports of a given version.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# For artifacts whose URL does not name a version (the latest reports, profiles):
+# cached copies are revalidated with their ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def is_valid_job_id(job_id: str) -> bool:
+    """
+    Checks that a job id is a uuid4 hex string, so it can safely be used as a path component.
+    """
+    return bool(JOB_ID_PATTERN.match(job_id))
+
+
+@lru_cache(maxsize=1024)
+def _content_etag(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Hashes the file content into a strong ETag.
+    The stat values are part of the cache key so a rewritten file is hashed again.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()}"'
+
+
+def get_content_etag(path: str, stat_result: os.stat_result) -> str:
+    """
+    Returns the strong ETag of a file, computing the content hash only once per file version.
+    """
+    return _content_etag(path, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def is_not_modified(
+    request_headers: Headers, etag: str, stat_result: os.stat_result
+) -> bool:
+    """
+    Evaluates the If-None-Match and If-Modified-Since conditional headers.
+    If-None-Match takes precedence when both are present (RFC 9110, section 13.2.2).
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+
+    return False
+
+
+def build_cache_headers(
+    etag: str,
+    stat_result: os.stat_result,
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+) -> dict:
+    """
+    Returns the validator and caching headers shared by 200, 206 and 304 responses.
+    """
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+class ReportFileResponse(FileResponse):
+    """
+    FileResponse validating If-Range against our content ETag.
+    The body is read in chunks by the application; to send it with sendfile(2) instead,
+    set DOWNLOAD_OFFLOAD_HEADER so the front proxy serves the file.
+    """
+
+    def _should_use_range(
+        self, http_if_range: str, stat_result: os.stat_result
+    ) -> bool:
+        # Starlette compares If-Range against its own mtime based ETag; use ours instead.
+        return http_if_range in (self.headers["etag"], self.headers["last-modified"])
+
+
+def _offload_location(path: str) -> str:
+    """
+    Returns the value of the offload header handing the transfer of a job artifact to
+    the front proxy: an internal URI for nginx, the file path for Apache/lighttpd.
+    """
+    if settings.DOWNLOAD_OFFLOAD_HEADER.lower() == "x-sendfile":
+        return path
+    relative_path = os.path.relpath(path, OUTPUTS_DIR).replace(os.sep, "/")
+    return f"{settings.DOWNLOAD_OFFLOAD_PREFIX.rstrip('/')}/{relative_path}"
+
+
+def build_report_response(
+    request_headers: Headers,
+    path: str,
+    filename: str,
+    stat_result: os.stat_result,
+    etag: str,
+    media_type: Optional[str] = "application/pdf",
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+):
+    """
+    Builds either a 304 response or a (range-capable) file response for a report artifact.
+    """
+    headers = build_cache_headers(etag, stat_result, cache_control)
+    if is_not_modified(request_headers, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    return ReportFileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        headers=headers,
+        stat_result=stat_result,
+    )
+
+
+def build_offload_response(
+    path: str,
+    filename: str,
+    media_type: Optional[str] = "application/pdf",
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+) -> Response:
+    """
+    Hands the transfer of a report artifact to the front proxy, which sends the body
+    (and ranges) with sendfile.
+    The proxy replaces ETag and Last-Modified with its own validators and evaluates the
+    conditional headers against them, so no content hash is computed for these responses.
+    """
+    return Response(
+        media_type=media_type,
+        headers={
+            "Cache-Control": cache_control,
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            settings.DOWNLOAD_OFFLOAD_HEADER: _offload_location(path),
+        },
+    )
+
+
+class _ZipChunkBuffer:
+    """
+    Write-only, non-seekable sink for zipfile that is drained after every write,
+    so the archive never exists as a whole in memory or on disk.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class BundleMemberChanged(Exception):
+    """
+    Raised while streaming a bundle when a member file changed after it was added, the
+    archive then being cut short rather than silently holding a torn file.
+    """
+
+
+def _read_member(source: BinaryIO, size: int, chunk_size: int) -> Iterator[bytes]:
+    """
+    Reads exactly size bytes from an open member file.
+    """
+    remaining = size
+    while remaining:
+        chunk = source.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+    if remaining or source.read(1):
+        raise BundleMemberChanged(f"{source.name} changed size while being zipped")
+
+
+def iter_zip_stream(
+    members: Iterable[Tuple[str, str]], chunk_size: int = HASH_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Streams a ZIP archive built on the fly from (arcname, path) pairs.
+    PDFs are already compressed, so members are stored rather than deflated.
+    Memory use is bounded by chunk_size regardless of the size of the members.
+    Each member is read from the file it had when opened, up to the size it had then.
+    """
+    sink = _ZipChunkBuffer()
+
+    def generate() -> Iterator[bytes]:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for arcname, path in members:
+                with open(path, "rb") as source:
+                    stat_result = os.fstat(source.fileno())
+                    zinfo = zipfile.ZipInfo(
+                        arcname, time.localtime(stat_result.st_mtime)[:6]
+                    )
+                    zinfo.external_attr = (stat_result.st_mode & 0xFFFF) << 16
+                    zinfo.file_size = stat_result.st_size
+                    zinfo.compress_type = zipfile.ZIP_STORED
+                    with archive.open(zinfo, mode="w") as target:
+                        for chunk in _read_member(
+                            source, stat_result.st_size, chunk_size
+                        ):
+                            target.write(chunk)
+                            yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+
+    return (data for data in generate() if data)
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from jinja2 import Environment, FileSystemLoader
+from src.logger.logger import get_logger
+from src.services.service_report_types import (
+    PASSING_SCORE,
+    PSI_CATEGORIES,
+    branch_categories,
+)
+
+logger = get_logger(__file__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+REPORT_TITLES = {
+    "frontend": "Front-End Analysis Report",
+    "ui_ux": "UI/UX Analysis Report",
+    "seo": "SEO Analysis Report",
+}
+
+MAX_ISSUES = 15
+ACTION_COUNT = 5
+
+_environment = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR), trim_blocks=True, autoescape=False
+)
+
+
+def rank_failing_audits(category_data: Dict[str, dict], categories) -> List[dict]:
+    """
+    Returns the failing audits of the given categories, most impactful first.
+    Impact is (1 - score) * weight; audits without a weight (e.g. from the local analyzer)
+    count as weight 1, while Lighthouse's weight-0 diagnostics keep no impact and are
+    listed after the weighted audits.
+    """
+    issues = {}
+    for category in categories:
+        for audit in category_data.get(category, {}).get("audits", []):
+            score = audit.get("score")
+            if score is None or score >= PASSING_SCORE:
+                continue
+            weight = audit.get("weight")
+            weight = 1 if weight is None else weight
+            impact = (1 - score) * weight
+            # Audits shared by several categories are listed once, with their highest impact
+            if audit["id"] not in issues or issues[audit["id"]]["impact"] < impact:
+                issues[audit["id"]] = {
+                    **audit,
+                    "category": category,
+                    "weight": weight,
+                    "impact": impact,
+                }
+
+    return sorted(issues.values(), key=lambda issue: (-issue["impact"], issue["score"]))
+
+
+def _display_score(data: dict) -> str:
+    if "error" in data:
+        return f"unavailable ({data['error']})"
+    if data.get("score") is None:
+        return "n/a"
+    return f"{round(data['score'] * 100)}/100"
+
+
+def render_fast_report(
+    report_type: str, url: str, category_data: Dict[str, dict]
+) -> str:
+    """
+    Renders the Markdown report of the given type from PSI (or local analyzer) data only.
+    """
+    categories = branch_categories(report_type)
+    sources = {
+        (
+            "local page analysis"
+            if category_data.get(category, {}).get("source") == "local"
+            else "PageSpeed Insights"
+        )
+        for category in categories
+        if "error" not in category_data.get(category, {})
+    }
+    return _environment.get_template("fast_report.md.j2").render(
+        title=REPORT_TITLES[report_type],
+        url=url,
+        source=", ".join(sorted(sources)) or "PageSpeed Insights",
+        generated_at=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+        categories=[
+            {
+                "name": PSI_CATEGORIES[category],
+                "display": _display_score(category_data.get(category, {})),
+            }
+            for category in categories
+        ],
+        issues=rank_failing_audits(category_data, categories)[:MAX_ISSUES],
+        action_count=ACTION_COUNT,
+    )
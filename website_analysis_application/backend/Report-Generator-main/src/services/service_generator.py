@@ -1,27 +1,310 @@
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from functools import lru_cache
+from typing import Dict, List, Optional
 
+import litellm
 from crewai import LLM, Crew
+from crewai.tasks.task_output import TaskOutput
+from fastapi.concurrency import run_in_threadpool
 from langchain_groq import ChatGroq
 from src.config.settings import get_settings
 from src.logger.logger import get_logger
+from src.services.service_cancel import (
+    JobCancelled,
+    current_job_id,
+    raise_if_cancelled,
+    run_cancellable,
+)
+from src.services.service_checkpoint import (
+    ACQUIRED_DATA_CHECKPOINT,
+    ACQUISITION_CHECKPOINT,
+    delete_checkpoint,
+    load_checkpoint,
+    save_checkpoint,
+    task_checkpoint_name,
+    task_checkpointer,
+)
 from src.services.service_crewai.agents import create_agents
-from src.services.service_crewai.tasks import create_tasks
+from src.services.service_crewai.shared_context import (
+    TokenUsage,
+    build_shared_contexts,
+    current_token_usage,
+    warm_up_prefix,
+)
+from src.services.service_crewai.tasks import BRANCH_TASKS, create_tasks
 from src.services.service_crewai.tools import *
+from src.services.service_fast_report import render_fast_report
+from src.services.service_memory import (
+    MemoryAccount,
+    current_memory_account,
+    get_memory_summary,
+)
+from src.services.service_profiler import (
+    JobProfiler,
+    current_profiler,
+    profile_thread,
+    profiled,
+)
+from src.services.service_rate_limit import RateLimitTimeout, get_upstream_limiter
+from src.services.service_report_types import REPORT_TYPES
+from src.services.service_snapshot import (
+    PAGE_FORMATS,
+    build_snapshot,
+    diff_snapshots,
+    fetch_validators,
+    load_snapshot,
+    save_snapshot,
+)
+from src.services.service_state import get_state_backend
 
 settings = get_settings()
 logger = get_logger(__file__)
 
+# Must be a volume shared by every worker serving downloads
+OUTPUTS_DIR = os.path.abspath(settings.OUTPUTS_DIR)
 
-async def agenerate_report(url: str):
 
-    llm = LLM(
+def get_job_output_dir(job_id: str) -> str:
+    """
+    Returns the directory holding the artifacts of a report generation job.
+    """
+    return os.path.join(OUTPUTS_DIR, job_id)
+
+
+def get_version_dir(job_id: str, version: Optional[int]) -> str:
+    """
+    Returns the directory holding the reports of one run of a job. Each run writes a new
+    version, so published reports never change; jobs run before reports were versioned
+    have theirs in the job's output directory (version None).
+    """
+    if version is None:
+        return get_job_output_dir(job_id)
+    return os.path.join(get_job_output_dir(job_id), f"v{version}")
+
+
+def get_report_pdf_path(
+    job_id: str, report_type: str, version: Optional[int] = None
+) -> str:
+    """
+    Returns the path of the PDF report of the given type for a version of a job.
+    """
+    return os.path.join(get_version_dir(job_id, version), f"{report_type}_report.pdf")
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Returns the metadata of a job, as seen by every worker.
+    """
+    return get_state_backend().get("jobs", job_id)
+
+
+def set_job_status(job_id: str, status: str, **fields):
+    """
+    Records the status of a job in the shared state, merged with its previous metadata.
+    """
+    job = get_job(job_id) or {"job_id": job_id, "created_at": time.time()}
+    job.update(fields, status=status, updated_at=time.time())
+    get_state_backend().set("jobs", job_id, job)
+
+
+def is_job_resumable(job: dict) -> bool:
+    """
+    Tells whether a job can be resumed: it failed, was rejected or cancelled, or its
+    worker stopped updating it (e.g. it was restarted).
+    """
+    if job["status"] in ("failed", "rejected", "cancelled"):
+        return True
+    return (
+        job["status"] in ("queued", "running")
+        and time.time() - job["updated_at"] > settings.JOB_STALE_AFTER
+    )
+
+
+class ReportBranchesFailed(Exception):
+    """
+    Raised when report branches still fail after their retries.
+    Their completed tasks are checkpointed, so resuming the job only redoes the rest.
+    """
+
+    def __init__(self, failed_branches: dict):
+        self.failed_branches = failed_branches
+        super().__init__(f"Report branches failed: {failed_branches}")
+
+
+def get_report_md_path(
+    job_id: str, report_type: str, version: Optional[int] = None
+) -> str:
+    """
+    Returns the path of the Markdown report of the given type for a version of a job.
+    """
+    return os.path.join(get_version_dir(job_id, version), f"{report_type}_report.md")
+
+
+def get_published_version(job: dict) -> Optional[int]:
+    """
+    Returns the version of a job's reports served for download: that of its last
+    completed run.
+    """
+    return job.get("version")
+
+
+def _new_version(job_id: str) -> int:
+    """
+    Allocates the version a run of a job writes its reports into.
+    """
+    return get_state_backend().increment("versions", job_id)
+
+
+@contextmanager
+def _atomic_output(path: str):
+    """
+    Yields a temporary path next to path, moved over it once written, so readers never
+    see a partially written file.
+    """
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{uuid.uuid4().hex}.{name}")
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _write_text(path: str, content: str):
+    with _atomic_output(path) as temp_path:
+        with open(temp_path, "w") as file:
+            file.write(content)
+
+
+def _render_pdf(job_id: str, report_type: str, version: int):
+    with _atomic_output(get_report_pdf_path(job_id, report_type, version)) as temp_path:
+        from_md_to_pdf(get_report_md_path(job_id, report_type, version), temp_path)
+
+
+def _published_report_paths(job_id: str, report_type: str) -> Optional[tuple]:
+    """
+    Returns the Markdown and PDF paths of a report published by a job, if it has one.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    version = get_published_version(job)
+    paths = (
+        get_report_md_path(job_id, report_type, version),
+        get_report_pdf_path(job_id, report_type, version),
+    )
+    return paths if all(os.path.isfile(path) for path in paths) else None
+
+
+def _reuse_report(previous_job_id: str, job_id: str, report_type: str, version: int):
+    """
+    Copies a report of a previous job into the current job, keeping artifacts job-scoped.
+    """
+    paths = (
+        get_report_md_path(job_id, report_type, version),
+        get_report_pdf_path(job_id, report_type, version),
+    )
+    for previous_path, path in zip(
+        _published_report_paths(previous_job_id, report_type), paths
+    ):
+        with _atomic_output(path) as temp_path:
+            shutil.copyfile(previous_path, temp_path)
+
+
+class RateLimitedLLM(LLM):
+    """
+    LLM whose completions are throttled by the OpenAI rate limit of its API key, and
+    stopped when the job they are made for is cancelled. A completion cannot be aborted
+    in flight, so it is bounded by LLM_TIMEOUT instead.
+
+    The token usage of each response is added to the current job's. crewai's callbacks
+    are not used for it: they are set process-wide on litellm, so concurrent requests
+    would count each other's tokens.
+    """
+
+    def _complete(self, messages: List[Dict[str, str]], max_tokens: Optional[int]):
+        # The parameters of crewai's LLM.call, which only returns the response content
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "timeout": self.timeout,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "n": self.n,
+            "stop": self.stop,
+            "max_tokens": max_tokens or self.max_tokens or self.max_completion_tokens,
+            "presence_penalty": self.presence_penalty,
+            "frequency_penalty": self.frequency_penalty,
+            "logit_bias": self.logit_bias,
+            "response_format": self.response_format,
+            "seed": self.seed,
+            "logprobs": self.logprobs,
+            "top_logprobs": self.top_logprobs,
+            "api_base": self.base_url,
+            "api_version": self.api_version,
+            "api_key": self.api_key,
+            "stream": False,
+            **self.kwargs,
+        }
+        return litellm.completion(
+            **{name: value for name, value in params.items() if value is not None}
+        )
+
+    def call(
+        self,
+        messages: List[Dict[str, str]],
+        callbacks: Optional[list] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        raise_if_cancelled()
+        limiter = get_upstream_limiter("openai", self.api_key)
+        if not limiter.acquire(timeout=settings.UPSTREAM_MAX_WAIT):
+            raise RateLimitTimeout(
+                f"openai rate limit: no capacity within {settings.UPSTREAM_MAX_WAIT}s"
+            )
+        response = run_cancellable(self._complete, messages, max_tokens)
+        token_usage = current_token_usage.get()
+        if token_usage is not None:
+            token_usage.add(getattr(response, "usage", None))
+        return response["choices"][0]["message"]["content"]
+
+    def warm_up(self, prefix: str):
+        """
+        Sends a one-token completion of the prefix, so the provider caches it before
+        the requests starting with it are sent in parallel.
+        """
+        self.call([{"role": "system", "content": prefix}], max_tokens=1)
+
+
+@lru_cache(maxsize=None)
+def get_llms() -> tuple:
+    """
+    Returns the text and vision LLMs, built once per process and shared by every job:
+    they hold no job state, and litellm reuses the HTTP client of their API key.
+    Agents only add their stop words, which are the same for every job.
+    """
+    llm = RateLimitedLLM(
         model="chatgpt-4o-latest",
         temperature=0.7,
         api_key=settings.OPENAI_API_KEY,
+        timeout=settings.LLM_TIMEOUT,
     )
 
-    vision_llm = LLM(
-        model="chatgpt-4o-latest", temperature=0.7, api_key=settings.OPENAI_API_KEY
+    vision_llm = RateLimitedLLM(
+        model="chatgpt-4o-latest",
+        temperature=0.7,
+        api_key=settings.OPENAI_API_KEY,
+        timeout=settings.LLM_TIMEOUT,
     )
 
     # vision_llm = ChatGroq(
@@ -30,31 +313,493 @@ async def agenerate_report(url: str):
     #     model_name=settings.VISION_MODEL,
     # )
 
+    return llm, vision_llm
+
+
+def _restore_task(task, checkpoint: dict):
+    """
+    Sets the output of a task from its checkpoint, so the tasks using it as context
+    get it without running it again.
+    """
+    task.output = TaskOutput(
+        name=task.name,
+        description=task.description,
+        expected_output=task.expected_output,
+        raw=checkpoint["raw"],
+        agent=checkpoint["agent"],
+    )
+
+
+def _run_task(task):
+    """
+    Runs a single task in its own crew, so a failing task only affects its branch.
+    """
+    crew = Crew(agents=[task.agent], tasks=[task], verbose=False)
+    crew.kickoff()
+
+
+def _warm_up(job_id: str, llm: RateLimitedLLM, contexts: List[str]):
+    """
+    Caches the prompt prefix the specialists about to run have in common, so their
+    parallel requests are served from the prompt cache instead of all missing it.
+    """
+    prefix = warm_up_prefix(contexts)
+    if prefix is None:
+        return
+    try:
+        llm.warm_up(prefix)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        logger.warning(f"Job {job_id}: warming up the prompt cache failed: {e}")
+
+
+def _run_crew(
+    url: str,
+    job_id: str,
+    version: int,
+    report_types: list,
+    shared_contexts: Optional[Dict[str, str]] = None,
+) -> tuple:
+    """
+    Runs the report branches of the given types in parallel and writes their Markdown
+    reports. Tasks completed by a previous attempt of the job are restored from their
+    checkpoints instead of being run again, and a failing branch is retried on its own.
+
+    Returns:
+        tuple: the prompt token usage of the run with its prompt cache hit rate, and the
+        errors of the branches that still failed, by report type.
+    """
+
+    llm, vision_llm = get_llms()
+    agents = create_agents(llm, vision_llm, shared_contexts)
+    branches = create_tasks(agents, url, report_types, task_checkpointer(job_id))
+
+    # The image analysis task is shared by two branches and must only run once
+    task_locks = {
+        id(task): threading.Lock() for tasks in branches.values() for task in tasks
+    }
+    # Set before the branch threads copy the job's context, so they all add to it
+    token_usage = TokenUsage()
+    usage_token = current_token_usage.set(token_usage)
+
+    def run_branch(report_type: str):
+        for task in branches[report_type]:
+            raise_if_cancelled(job_id)
+            with task_locks[id(task)]:
+                if task.output is not None:
+                    continue
+                checkpoint = load_checkpoint(job_id, task_checkpoint_name(task.name))
+                if checkpoint is not None:
+                    logger.info(f"Job {job_id}: restored task {task.name}")
+                    _restore_task(task, checkpoint)
+                    continue
+                _run_task(task)
+
+        _write_text(
+            get_report_md_path(job_id, report_type, version),
+            branches[report_type][-1].output.raw,
+        )
+
+    def run_branch_with_retries(report_type: str):
+        for attempt in range(settings.BRANCH_RETRIES + 1):
+            try:
+                return run_branch(report_type)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                if attempt == settings.BRANCH_RETRIES:
+                    raise
+                logger.warning(f"Job {job_id}: retrying {report_type} branch: {e}")
+
+    try:
+        # Agents of the tasks left to run, whose requests start with their context
+        pending_agents = [
+            task.agent
+            for tasks in branches.values()
+            for task in tasks
+            if load_checkpoint(job_id, task_checkpoint_name(task.name)) is None
+        ]
+        _warm_up(
+            job_id,
+            llm,
+            [
+                shared_context
+                for name, shared_context in (shared_contexts or {}).items()
+                if any(agents[name] is agent for agent in pending_agents)
+            ],
+        )
+
+        with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+            # Each branch thread runs in a copy of the job's context, to see its job id
+            futures = {
+                report_type: executor.submit(
+                    copy_context().run,
+                    profiled(run_branch_with_retries, "branch"),
+                    report_type,
+                )
+                for report_type in branches
+            }
+    finally:
+        current_token_usage.reset(usage_token)
+
+    for future in futures.values():
+        if isinstance(future.exception(), JobCancelled):
+            raise future.exception()
+
+    failed_branches = {
+        report_type: str(future.exception())
+        for report_type, future in futures.items()
+        if future.exception() is not None
+    }
+
+    return token_usage.summary(), failed_branches
+
+
+def _run_as_job(
+    function, url: str, job_id: str, *args, profiler: Optional[JobProfiler] = None
+):
+    """
+    Runs a job in the current thread, marked as the job's thread for cancellation,
+    memory accounting and profiling. The tool instances the job creates are its own, and
+    released when it ends.
+    """
+    job_token = current_job_id.set(job_id)
+    memory_token = current_memory_account.set(MemoryAccount())
+    profiler_token = current_profiler.set(profiler)
+    registry_token = current_tool_registry.set({})
+    try:
+        with profile_thread("job"):
+            return function(url, job_id, *args)
+    finally:
+        release_tool_registry(current_tool_registry.get())
+        current_tool_registry.reset(registry_token)
+        current_profiler.reset(profiler_token)
+        current_memory_account.reset(memory_token)
+        current_job_id.reset(job_token)
+
+
+def _save_profile(profiler: JobProfiler, job_id: str):
+    """
+    Writes the profile artifacts of a job next to its reports and records its summary.
+    """
+    try:
+        summary = profiler.save(get_job_output_dir(job_id))
+        job = get_job(job_id)
+        set_job_status(job_id, job["status"], profile=summary)
+        logger.info(
+            f"Job {job_id}: profiled {summary['wall_seconds']:.2f}s wall, "
+            f"{summary['event_loop']['cpu_seconds']:.2f}s event loop CPU, "
+            f"{summary['worker_threads']['cpu_seconds']:.2f}s worker threads CPU"
+        )
+    except Exception as e:
+        logger.error(f"Job {job_id}: saving the profile failed: {e}")
+
+
+async def agenerate_report(
+    url: str,
+    job_id: str,
+    incremental: bool = True,
+    mode: str = "full",
+    profile: bool = False,
+):
+    """
+    Runs generate_report (or generate_fast_report in fast mode) in a worker thread, so the
+    blocking upstream calls and the crew do not stall the event loop while other jobs
+    are admitted or queued.
+
+    A profiled job records a sampling profile of the event loop and of its worker
+    threads, saved with its reports even when it fails.
+    """
+    function, args = (
+        (generate_fast_report, ())
+        if mode == "fast"
+        else (generate_report, (incremental,))
+    )
+    if not profile:
+        return await run_in_threadpool(_run_as_job, function, url, job_id, *args)
+
+    profiler = JobProfiler(job_id)
+    profiler.start()
+    try:
+        return await run_in_threadpool(
+            _run_as_job, function, url, job_id, *args, profiler=profiler
+        )
+    finally:
+        profiler.stop()
+        await run_in_threadpool(_save_profile, profiler, job_id)
+
+
+def generate_fast_report(url: str, job_id: str):
+    """
+    Generates the three reports from the PageSpeed Insights audits only, without any LLM.
+    Fast reports are not snapshotted, so incremental jobs never reuse them.
+
+    Returns:
+        tuple: the PDF report paths (in REPORT_TYPES order) and None, as there is no diff.
+    """
+    version = _new_version(job_id)
+    os.makedirs(get_version_dir(job_id, version), mode=0o777, exist_ok=True)
+    set_job_status(job_id, "running", url=url, mode="fast")
+
+    try:
+        pagespeedinsights_tool = PageSpeedInsightsTool(url)
+        category_data = pagespeedinsights_tool.data
+    finally:
+        PageSpeedInsightsTool.release(url)
+
+    report_pdf_file_paths = []
+    for report_type in REPORT_TYPES:
+        raise_if_cancelled(job_id)
+        _write_text(
+            get_report_md_path(job_id, report_type, version),
+            render_fast_report(report_type, url, category_data),
+        )
+        _render_pdf(job_id, report_type, version)
+        report_pdf_file_paths.append(get_report_pdf_path(job_id, report_type, version))
+
+    # Publishes the new version of the reports
+    set_job_status(job_id, "completed", reports=list(REPORT_TYPES), version=version)
+
+    return report_pdf_file_paths, None
+
+
+def _content_hashes(acquired: dict) -> dict:
+    """
+    Returns the sha256 of each acquired payload, checking the restored payloads.
+    """
+    return {
+        name: hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        for name, data in acquired.items()
+    }
+
+
+def _restore_acquired(url: str, job_id: str, checkpoint: dict) -> Optional[dict]:
+    """
+    Returns the data acquired by a resumed job, if a branch is generated again.
+    The data is restored from its checkpoint, and given to the job's tools so its tasks
+    all see the same data. Without it (e.g. no branch was generated until one was
+    rerun), the current data is used; if it changed since it was acquired, the
+    completed tasks of the branches are run again on it.
+    """
+    rerun = checkpoint["diff_summary"]["rerun"]
+    if not rerun:
+        return None
+
+    saved = load_checkpoint(job_id, ACQUIRED_DATA_CHECKPOINT)
+    if saved is not None:
+        acquired = {"psi": saved["psi"], "jina": saved["jina"]}
+        if _content_hashes(acquired) == checkpoint["acquired"]:
+            PageSpeedInsightsTool(url, acquired["psi"])
+            JinaAITool(url, acquired["jina"])
+            return acquired
+
+    acquired = {"psi": PageSpeedInsightsTool(url).data, "jina": JinaAITool(url).data}
+    if checkpoint["acquired"] not in (None, _content_hashes(acquired)):
+        logger.warning(
+            f"Job {job_id}: the data of {url} changed since it was acquired, "
+            "the completed tasks are run again on the current data"
+        )
+        for report_type in rerun:
+            for task_name in BRANCH_TASKS[report_type]:
+                delete_checkpoint(job_id, task_checkpoint_name(task_name))
+    return acquired
+
+
+def _acquire(url: str, job_id: str, incremental: bool) -> tuple:
+    """
+    Acquires the PSI and Jina data of the URL and diffs it with the previous snapshot.
+    The result is checkpointed, and restored when the job is resumed.
+
+    A 304 on the page only shows that its Jina AI formats are unchanged: the PSI audits
+    also depend on its subresources and the server, so they are still fetched and
+    diffed, and Jina AI is only called if a branch has to be generated again.
+
+    Returns:
+        tuple: the validators, the current snapshot, the diff summary and the acquired
+        {"psi", "jina"} data (None when no branch is generated again).
+    """
+    checkpoint = load_checkpoint(job_id, ACQUISITION_CHECKPOINT)
+    if checkpoint is not None:
+        logger.info(f"Job {job_id}: restored acquisition of {url}")
+        return (
+            checkpoint["validators"],
+            checkpoint["snapshot"],
+            checkpoint["diff_summary"],
+            _restore_acquired(url, job_id, checkpoint),
+        )
+
+    previous_snapshot = load_snapshot(url) if incremental else None
+    validators = fetch_validators(url, previous_snapshot)
+
     pagespeedinsights_tool = PageSpeedInsightsTool(url)
-    jina = JinaAITool(url)
+    if validators["not_modified"]:
+        logger.info(f"{url} not modified since job {previous_snapshot['job_id']}")
+        jina_data = None
+        current_snapshot = {
+            **build_snapshot(pagespeedinsights_tool.data, {}),
+            **{
+                f"{name}_hash": previous_snapshot.get(f"{name}_hash")
+                for name in PAGE_FORMATS
+            },
+        }
+    else:
+        jina_data = JinaAITool(url).data
+        current_snapshot = build_snapshot(pagespeedinsights_tool.data, jina_data)
+
+    diff_summary = diff_snapshots(previous_snapshot, current_snapshot)
+    diff_summary["not_modified"] = validators["not_modified"]
 
-    agents = create_agents(llm, vision_llm)
-    tasks = create_tasks(agents, url)
+    for report_type in list(diff_summary["reused"]):
+        if not _published_report_paths(diff_summary["previous_job_id"], report_type):
+            diff_summary["reused"].remove(report_type)
+            diff_summary["rerun"].append(report_type)
 
-    crew = Crew(
-        agents=list(agents.values()), tasks=tasks, verbose=False, async_execution=True
+    acquired = None
+    if diff_summary["rerun"]:
+        if jina_data is None:
+            jina_data = JinaAITool(url).data
+        acquired = {"psi": pagespeedinsights_tool.data, "jina": jina_data}
+
+    if acquired:
+        save_checkpoint(job_id, ACQUIRED_DATA_CHECKPOINT, acquired)
+    save_checkpoint(
+        job_id,
+        ACQUISITION_CHECKPOINT,
+        {
+            "validators": validators,
+            "snapshot": current_snapshot,
+            "diff_summary": diff_summary,
+            "acquired": _content_hashes(acquired) if acquired else None,
+        },
     )
+    return validators, current_snapshot, diff_summary, acquired
+
+
+def rerun_branch(job_id: str, report_type: str):
+    """
+    Makes resuming a job generate one of its report branches again: the branch's task
+    checkpoints are dropped and it is no longer reused from the previous job.
+
+    Raises:
+        ValueError: if the acquisition checkpoint of the job has expired.
+    """
+    checkpoint = load_checkpoint(job_id, ACQUISITION_CHECKPOINT)
+    if checkpoint is None:
+        raise ValueError("The acquisition of the job has expired")
+
+    for task_name in BRANCH_TASKS[report_type]:
+        delete_checkpoint(job_id, task_checkpoint_name(task_name))
+    diff_summary = checkpoint["diff_summary"]
+    if report_type in diff_summary["reused"]:
+        diff_summary["reused"].remove(report_type)
+    if report_type not in diff_summary["rerun"]:
+        diff_summary["rerun"].append(report_type)
+    save_checkpoint(job_id, ACQUISITION_CHECKPOINT, checkpoint)
+    logger.info(f"Job {job_id}: the {report_type} branch will be generated again")
 
-    crew_output = crew.kickoff()
-    path_prefix = os.path.join(os.getcwd(), "outputs/")
-    os.makedirs(path_prefix, mode=0o777, exist_ok=True)
 
-    frontend_input_path = "frontend_report.md"
-    frontend_output_path = path_prefix + frontend_input_path[:-3] + ".pdf"
+def generate_report(url: str, job_id: str, incremental: bool = True):
+    """
+    Generates the frontend, UI/UX and SEO reports of a URL into a new version of the
+    job's reports, published once they are all written.
 
-    ui_ux_input_path = "ui_ux_report.md"
-    ui_ux_output_path = path_prefix + ui_ux_input_path[:-3] + ".pdf"
+    When incremental, the acquired data is compared with the snapshot of the last
+    analysis of the same URL and only the report branches whose inputs changed are
+    generated again; the others are reused from the previous job.
 
-    seo_input_path = "seo_report.md"
-    seo_output_path = path_prefix + seo_input_path[:-3] + ".pdf"
+    Acquisition results and task outputs are checkpointed, so calling it again for a
+    failed or interrupted job resumes it from its last completed steps.
 
-    from_md_to_pdf(frontend_input_path, frontend_output_path)
-    from_md_to_pdf(ui_ux_input_path, ui_ux_output_path)
-    from_md_to_pdf(seo_input_path, seo_output_path)
+    Returns:
+        tuple: the PDF report paths (in REPORT_TYPES order) and the diff summary.
+    """
+    version = _new_version(job_id)
+    output_dir = get_version_dir(job_id, version)
+    os.makedirs(output_dir, mode=0o777, exist_ok=True)
+    set_job_status(
+        job_id, "running", url=url, mode="full", incremental=incremental, error=None
+    )
+
+    try:
+        raise_if_cancelled(job_id)
+        validators, current_snapshot, diff_summary, acquired = _acquire(
+            url, job_id, incremental
+        )
+
+        if diff_summary["rerun"]:
+            shared_contexts = build_shared_contexts(
+                url, acquired["psi"], acquired["jina"]
+            )
+            if {"ui_ux", "seo"} & set(diff_summary["rerun"]):
+                # Built once before the branches run in parallel, which share it
+                try:
+                    PageContentIndex(url)
+                except Exception as e:
+                    logger.error(f"Job {job_id}: indexing the page text failed: {e}")
+            usage, failed_branches = _run_crew(
+                url, job_id, version, diff_summary["rerun"], shared_contexts
+            )
+            logger.info(
+                f"Job {job_id}: {usage['cached_prompt_tokens']}/"
+                f"{usage['prompt_tokens']} prompt tokens served from cache "
+                f"({usage['cache_hit_rate']:.1%})"
+            )
+            set_job_status(
+                job_id, "running", usage=usage, failed_branches=failed_branches
+            )
+            if failed_branches:
+                raise ReportBranchesFailed(failed_branches)
+    finally:
+        PageSpeedInsightsTool.release(url)
+        PageContentIndex.release(url)
+        JinaAITool.release(url)
+
+    logger.info(
+        f"Job {job_id}: rerun {diff_summary['rerun']}, reused {diff_summary['reused']}"
+    )
+
+    report_pdf_file_paths = []
+    for report_type in REPORT_TYPES:
+        # Skip the remaining PDF renders of a cancelled job
+        raise_if_cancelled(job_id)
+        if report_type in diff_summary["reused"]:
+            _reuse_report(diff_summary["previous_job_id"], job_id, report_type, version)
+        else:
+            _render_pdf(job_id, report_type, version)
+        report_pdf_file_paths.append(get_report_pdf_path(job_id, report_type, version))
+
+    _write_text(
+        os.path.join(output_dir, "diff_summary.json"),
+        json.dumps(diff_summary, indent=2),
+    )
+
+    save_snapshot(
+        url,
+        {
+            **current_snapshot,
+            "url": url,
+            "job_id": job_id,
+            "etag": validators["etag"],
+            "last_modified": validators["last_modified"],
+        },
+    )
+
+    memory = get_memory_summary()
+    if memory is not None:
+        logger.info(
+            f"Job {job_id}: peak acquired payloads {memory['peak_chars']} characters"
+        )
+
+    # Publishes the new version of the reports
+    set_job_status(
+        job_id,
+        "completed",
+        reports=list(REPORT_TYPES),
+        memory=memory,
+        version=version,
+    )
 
-    return [frontend_output_path, ui_ux_output_path, seo_output_path]
+    return report_pdf_file_paths, diff_summary
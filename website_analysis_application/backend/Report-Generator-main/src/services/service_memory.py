@@ -0,0 +1,79 @@
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class MemoryAccount:
+    """
+    Size of the acquired payloads a job holds, with its peak: the PSI data, the Jina AI
+    formats, the page text index and the page fetched by the local analyzer. Sizes are
+    in characters (bytes for binary data) and tracked by label, e.g. "jina:html"; the
+    payloads of a tool are released with it.
+    """
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.allocations: Dict[str, int] = {}
+        self.truncated = []
+        self._lock = threading.Lock()
+
+    def allocate(self, label: str, size: int):
+        """
+        Sets the size held under a label, growing or shrinking it.
+        """
+        with self._lock:
+            self.current += size - self.allocations.get(label, 0)
+            self.allocations[label] = size
+            self.peak = max(self.peak, self.current)
+
+    def release(self, label: str):
+        """
+        Forgets the size held under a label.
+        """
+        with self._lock:
+            self.current -= self.allocations.pop(label, 0)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "current_chars": self.current,
+                "peak_chars": self.peak,
+                "allocations": dict(self.allocations),
+                "truncated": list(self.truncated),
+            }
+
+
+# Account of the job run by the current thread
+current_memory_account: ContextVar[Optional[MemoryAccount]] = ContextVar(
+    "current_memory_account", default=None
+)
+
+
+def track_allocation(label: str, size: int):
+    """
+    Records a payload held by the current job, if any.
+    """
+    account = current_memory_account.get()
+    if account is not None:
+        account.allocate(label, size)
+
+
+def track_release(label: str):
+    """
+    Records that the current job no longer holds a payload, if any.
+    """
+    account = current_memory_account.get()
+    if account is not None:
+        account.release(label)
+
+
+def track_truncation(label: str):
+    account = current_memory_account.get()
+    if account is not None:
+        account.truncated.append(label)
+
+
+def get_memory_summary() -> Optional[dict]:
+    account = current_memory_account.get()
+    return account.summary() if account is not None else None
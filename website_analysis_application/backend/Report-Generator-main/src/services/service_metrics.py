@@ -0,0 +1,28 @@
+from typing import Dict
+
+from src.services.service_cancel import CANCELLATION_REASONS
+from src.services.service_state import get_state_backend
+
+
+def increment_counter(name: str, amount: int = 1):
+    """
+    Adds to a counter shared by every worker.
+    """
+    get_state_backend().increment("metrics", name, amount)
+
+
+def get_counter(name: str) -> int:
+    return get_state_backend().get("metrics", name) or 0
+
+
+def get_metrics() -> Dict[str, dict]:
+    """
+    Returns the counters of the deployment since the state backend was created.
+    """
+    cancellations = {
+        reason: get_counter(f"jobs_cancelled:{reason}")
+        for reason in CANCELLATION_REASONS
+    }
+    return {
+        "jobs_cancelled": {"total": sum(cancellations.values()), **cancellations},
+    }
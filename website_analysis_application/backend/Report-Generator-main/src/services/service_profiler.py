@@ -0,0 +1,275 @@
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+# Artifacts written into the job's output directory, by download format
+PROFILE_ARTIFACTS = {
+    "collapsed": "profile.collapsed",
+    "pstats": "profile.pstats",
+    "summary": "profile.json",
+}
+
+# Roles of the threads sampled for a job: the event loop serving it, the worker thread
+# running it, its PSI category and local page analysis threads (parsing and compacting
+# the audits), its report branch threads and the threads of its upstream calls
+THREAD_ROLES = (
+    "event_loop",
+    "job",
+    "psi",
+    "local_analysis",
+    "branch",
+    "upstream",
+)
+WORKER_ROLES = THREAD_ROLES[1:]
+
+
+class JobProfiler:
+    """
+    Sampling profiler of a single job. A background thread samples the stacks of the
+    threads working for the job at a fixed interval, so concurrent jobs can be profiled
+    independently and the overhead does not depend on the number of calls made.
+
+    Wall-clock and CPU time are measured per thread role. The event loop is shared by
+    every request of the worker, so its CPU time covers all of them during the job.
+    """
+
+    def __init__(self, job_id: str, interval: float = None):
+        self.job_id = job_id
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        # Roles of the threads currently working for the job, by thread id
+        self._threads: Dict[int, str] = {}
+        self._wall = Counter()
+        self._cpu = Counter()
+        self._thread_counts = Counter()
+        # Seconds and samples of each (role, stack of code objects from the root)
+        self._stacks: Counter = Counter()
+        self._stack_samples: Counter = Counter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_at = None
+        self._loop_cpu_at_start = None
+        self.wall_seconds = None
+
+    def start(self):
+        """
+        Starts sampling, from the event loop thread serving the job.
+        """
+        self._started_at = time.perf_counter()
+        self._loop_cpu_at_start = time.thread_time()
+        with self._lock:
+            self._threads[threading.get_ident()] = "event_loop"
+        self._thread_counts["event_loop"] += 1
+        self._sampler = threading.Thread(
+            target=self._sample, name=f"profiler-{self.job_id}", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self):
+        """
+        Stops sampling, from the event loop thread that started it.
+        """
+        self._stopped.set()
+        self._sampler.join()
+        self.wall_seconds = time.perf_counter() - self._started_at
+        self._wall["event_loop"] += self.wall_seconds
+        self._cpu["event_loop"] += time.thread_time() - self._loop_cpu_at_start
+
+    @contextmanager
+    def thread(self, role: str):
+        """
+        Samples and times the current thread as working for the job, in the given role.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = role
+            self._thread_counts[role] += 1
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.pop(ident, None)
+                self._wall[role] += time.perf_counter() - wall_start
+                self._cpu[role] += time.thread_time() - cpu_start
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+                for ident, role in threads:
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    key = (role, tuple(reversed(stack)))
+                    self._stacks[key] += elapsed
+                    self._stack_samples[key] += 1
+                self._samples += 1
+            del frames
+
+    def summary(self) -> dict:
+        """
+        Returns the wall-clock and CPU seconds of the job, overall and by thread role.
+        The wall-clock time of a role adds up the time each of its threads worked for
+        the job, so it can exceed the job's when they run in parallel.
+        """
+        with self._lock:
+            threads = {
+                role: {
+                    "wall_seconds": round(self._wall[role], 6),
+                    "cpu_seconds": round(self._cpu[role], 6),
+                    "threads": self._thread_counts[role],
+                }
+                for role in THREAD_ROLES
+            }
+            samples = self._samples
+        return {
+            "job_id": self.job_id,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(
+                sum(role["cpu_seconds"] for role in threads.values()), 6
+            ),
+            "event_loop": threads["event_loop"],
+            "worker_threads": {
+                "wall_seconds": round(
+                    sum(threads[role]["wall_seconds"] for role in WORKER_ROLES), 6
+                ),
+                "cpu_seconds": round(
+                    sum(threads[role]["cpu_seconds"] for role in WORKER_ROLES), 6
+                ),
+                "by_role": {role: threads[role] for role in WORKER_ROLES},
+            },
+            "sample_interval": self.interval,
+            "samples": samples,
+        }
+
+    def collapsed_stacks(self) -> str:
+        """
+        Returns the sampled stacks in the collapsed format of flame graph tools, one
+        "role;caller;...;callee milliseconds" line per stack.
+        """
+        with self._lock:
+            stacks = list(self._stacks.items())
+        lines = []
+        for (role, codes), seconds in sorted(stacks, key=lambda item: -item[1]):
+            frames = ";".join(
+                f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(
+                    ";", ":"
+                )
+                for code in codes
+            )
+            lines.append(f"{role};{frames} {round(seconds * 1000)}")
+        return "\n".join(lines) + "\n"
+
+    def pstats(self) -> dict:
+        """
+        Returns the sampled time as a pstats dictionary, loadable by pstats.Stats and the
+        tools reading cProfile dumps. Call counts are sample counts, and every role has
+        a "<role thread>" root function.
+        """
+        with self._lock:
+            stacks = [
+                (key, self._stack_samples[key], seconds)
+                for key, seconds in self._stacks.items()
+            ]
+
+        # [samples, own seconds, cumulative seconds] by function, and by caller/callee
+        functions = defaultdict(lambda: [0, 0.0, 0.0])
+        edges = defaultdict(lambda: [0, 0.0, 0.0])
+        for (role, codes), samples, seconds in stacks:
+            keys = [("~", 0, f"<{role} thread>")] + [
+                (code.co_filename, code.co_firstlineno, code.co_name) for code in codes
+            ]
+            # Recursive functions are only counted once per sample
+            for key in set(keys):
+                functions[key][0] += samples
+                functions[key][2] += seconds
+            functions[keys[-1]][1] += seconds
+            for edge in set(zip(keys, keys[1:])):
+                edges[edge][0] += samples
+                edges[edge][2] += seconds
+            edges[keys[-2], keys[-1]][1] += seconds
+
+        callers = defaultdict(dict)
+        for (caller, callee), (count, own, cumulative) in edges.items():
+            callers[callee][caller] = (count, count, own, cumulative)
+        return {
+            key: (count, count, own, cumulative, callers[key])
+            for key, (count, own, cumulative) in functions.items()
+        }
+
+    def save(self, output_dir: str) -> dict:
+        """
+        Writes the profile artifacts into a job's output directory.
+
+        Returns:
+            dict: the summary of the profile.
+        """
+        os.makedirs(output_dir, mode=0o777, exist_ok=True)
+        summary = self.summary()
+        with open(
+            os.path.join(output_dir, PROFILE_ARTIFACTS["collapsed"]), "w"
+        ) as file:
+            file.write(self.collapsed_stacks())
+        with open(os.path.join(output_dir, PROFILE_ARTIFACTS["pstats"]), "wb") as file:
+            marshal.dump(self.pstats(), file)
+        with open(os.path.join(output_dir, PROFILE_ARTIFACTS["summary"]), "w") as file:
+            json.dump(summary, file, indent=2)
+        return summary
+
+
+# Profiler of the job run by the current thread, if the job is profiled
+current_profiler: ContextVar[Optional[JobProfiler]] = ContextVar(
+    "current_profiler", default=None
+)
+
+
+@contextmanager
+def profile_thread(role: str):
+    """
+    Samples the current thread as working for the current job, if it is profiled.
+    """
+    profiler = current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.thread(role):
+        yield
+
+
+def profiled(function: Callable, role: str) -> Callable:
+    """
+    Wraps a function submitted to another thread, so the thread is sampled for the
+    current job while running it.
+    """
+    profiler = current_profiler.get()
+    if profiler is None:
+        return function
+
+    def run(*args, **kwargs):
+        with profiler.thread(role):
+            return function(*args, **kwargs)
+
+    return run
@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import requests
+from fastapi.concurrency import run_in_threadpool
+from requests.adapters import HTTPAdapter
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+from src.services.service_cancel import raise_if_cancelled, run_cancellable
+from src.services.service_state import get_state_backend
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+UPSTREAM_REQUESTS_PER_MINUTE = {
+    "psi": settings.PSI_REQUESTS_PER_MINUTE,
+    "jina": settings.JINA_REQUESTS_PER_MINUTE,
+    "openai": settings.OPENAI_REQUESTS_PER_MINUTE,
+}
+
+# Upstream requests are counted in windows of this many seconds, each allowing its share
+# of the per-minute quota
+RATE_LIMIT_WINDOW = 10
+
+MAX_429_RETRIES = 3
+
+
+class RateLimitTimeout(requests.RequestException):
+    """
+    Raised when no upstream token becomes available within the allowed wait.
+    Subclasses RequestException so the tools report it like any failed fetch.
+    """
+
+
+class SharedRateLimiter:
+    """
+    Limiter of an upstream quota shared by every worker and replica of the deployment.
+    Requests are counted in the state backend over fixed windows of RATE_LIMIT_WINDOW
+    seconds, and a 429 answer pauses the whole deployment for its Retry-After delay.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int):
+        self.name = name
+        self.limit = max(1, int(requests_per_minute * RATE_LIMIT_WINDOW / 60))
+
+    def penalize(self, seconds: float):
+        """
+        Stops handing out requests for `seconds`, e.g. after the upstream answered 429.
+        """
+        get_state_backend().set(
+            "rate_limit_penalties",
+            self.name,
+            {"until": time.time() + seconds},
+            ttl=max(1, math.ceil(seconds)),
+        )
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        Blocks until a request is allowed. Returns False if that takes longer than timeout.
+        """
+        backend = get_state_backend()
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            penalty = backend.get("rate_limit_penalties", self.name)
+            if penalty is not None and penalty["until"] > now:
+                wait_until = penalty["until"]
+            else:
+                window = int(now // RATE_LIMIT_WINDOW)
+                count = backend.increment(
+                    "rate_limits", f"{self.name}:{window}", ttl=2 * RATE_LIMIT_WINDOW
+                )
+                if count <= self.limit:
+                    return True
+                wait_until = (window + 1) * RATE_LIMIT_WINDOW
+            # Spread the waiting workers over the start of the next window
+            wait_until += random.uniform(0, 0.5)
+            if wait_until > deadline:
+                return False
+            time.sleep(wait_until - now)
+
+
+@lru_cache(maxsize=None)
+def _get_limiter(upstream: str, key_hash: str) -> SharedRateLimiter:
+    return SharedRateLimiter(
+        f"{upstream}:{key_hash}", UPSTREAM_REQUESTS_PER_MINUTE[upstream]
+    )
+
+
+def get_upstream_limiter(upstream: str, api_key: str) -> SharedRateLimiter:
+    """
+    Returns the limiter of an upstream, one per API key so separate keys keep separate quotas.
+    """
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return _get_limiter(upstream, key_hash)
+
+
+def _parse_retry_after(value: Optional[str]) -> float:
+    if not value:
+        return 1.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class AbortableAdapter(HTTPAdapter):
+    """
+    Transport adapter whose requests in flight can be aborted from another thread, by
+    shutting down the sockets of the connections they use.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._connections = []
+        self._lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def get_connection_with_tls_context(self, *args, **kwargs):
+        pool = super().get_connection_with_tls_context(*args, **kwargs)
+        if not getattr(pool, "_abortable", False):
+            get_conn = pool._get_conn
+
+            def get_tracked_conn(*args, **kwargs):
+                connection = get_conn(*args, **kwargs)
+                with self._lock:
+                    self._connections.append(connection)
+                return connection
+
+            pool._get_conn = get_tracked_conn
+            pool._abortable = True
+        return pool
+
+    def abort(self):
+        """
+        Makes the blocked reads and writes of the adapter's connections fail at once.
+        """
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            sock = getattr(connection, "sock", None)
+            if sock is None:
+                continue
+            try:
+                # On the raw socket: SSLSocket.shutdown would drop the TLS state
+                # another thread is reading with
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def rate_limited_get(
+    upstream: str, api_key: str, url: str, **kwargs
+) -> requests.Response:
+    """
+    requests.get throttled by the upstream's shared rate limit.
+    A 429 answer pauses the upstream for the Retry-After delay and the call is retried.
+    The request is aborted if the job it is made for is cancelled before the response
+    arrives. A streamed body is read by the caller, which checks the cancellation
+    between chunks.
+    """
+    limiter = get_upstream_limiter(upstream, api_key)
+    for attempt in range(MAX_429_RETRIES + 1):
+        if not limiter.acquire(timeout=settings.UPSTREAM_MAX_WAIT):
+            raise RateLimitTimeout(
+                f"{upstream} rate limit: no capacity within {settings.UPSTREAM_MAX_WAIT}s"
+            )
+        adapter = AbortableAdapter()
+        with requests.Session() as session:
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            response = run_cancellable(session.get, url, abort=adapter.abort, **kwargs)
+        if response.status_code != 429 or attempt == MAX_429_RETRIES:
+            return response
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        response.close()
+        logger.warning(f"{upstream} answered 429, backing off {retry_after:.1f}s")
+        limiter.penalize(retry_after)
+    return response
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when the job queue is full. Carries the suggested Retry-After in seconds.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the number of report jobs of a kind running at once across the whole
+    deployment, each kind keeping its slots and queue in its own namespaces.
+    A running job holds one of max_running slots in the state backend and a queued job
+    a queue entry, both leases renewed while the job lives, so those of a crashed worker
+    expire. Queued jobs are admitted by priority (higher first), then FIFO; once the
+    queue is full new jobs are rejected. A queued job leaves the queue as soon as its
+    cancellation is requested.
+    """
+
+    def __init__(self, max_running: int, max_queued: int, name: str = "admission"):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self._slots_namespace = f"{name}_slots"
+        self._queue_namespace = f"{name}_queue"
+        # Exponential moving average of job durations, used to estimate Retry-After
+        self._average_duration = 120.0
+
+    def retry_after(self, queued: int) -> int:
+        waves = (queued + self.max_running) / self.max_running
+        return max(1, int(waves * self._average_duration))
+
+    def _claim_slot(self, ticket: str) -> Optional[str]:
+        backend = get_state_backend()
+        for slot in range(self.max_running):
+            if backend.add(
+                self._slots_namespace,
+                str(slot),
+                {"ticket": ticket},
+                ttl=settings.ADMISSION_LEASE,
+            ):
+                return str(slot)
+        return None
+
+    def _try_admit(self, ticket: str) -> Tuple[Optional[str], int]:
+        """
+        Claims a slot for a new job unless jobs are already queued.
+        Returns the slot (None if the job has to queue) and the number of queued jobs.
+        """
+        queued = len(get_state_backend().items(self._queue_namespace))
+        return (self._claim_slot(ticket) if not queued else None), queued
+
+    def _poll_slot(
+        self, ticket: str, order: tuple, job_id: Optional[str]
+    ) -> Optional[str]:
+        """
+        Claims a slot for a queued job if fewer jobs are ahead of it than slots are free.
+        """
+        raise_if_cancelled(job_id)
+        backend = get_state_backend()
+        ahead = sum(
+            (-other["priority"], other["enqueued_at"], other_ticket) < order
+            for other_ticket, other in backend.items(self._queue_namespace).items()
+        )
+        free = self.max_running - len(backend.items(self._slots_namespace))
+        return self._claim_slot(ticket) if ahead < free else None
+
+    @staticmethod
+    async def _renew_lease(namespace: str, key: str, value: dict):
+        while True:
+            await asyncio.sleep(settings.ADMISSION_LEASE / 3)
+            await run_in_threadpool(
+                get_state_backend().set,
+                namespace,
+                key,
+                value,
+                ttl=settings.ADMISSION_LEASE,
+            )
+
+    async def _wait_for_slot(
+        self, ticket: str, priority: int, job_id: Optional[str] = None
+    ) -> str:
+        backend = get_state_backend()
+        entry = {"priority": priority, "enqueued_at": time.time()}
+        await run_in_threadpool(
+            backend.set,
+            self._queue_namespace,
+            ticket,
+            entry,
+            ttl=settings.ADMISSION_LEASE,
+        )
+        renewal = asyncio.create_task(
+            self._renew_lease(self._queue_namespace, ticket, entry)
+        )
+        order = (-priority, entry["enqueued_at"], ticket)
+        try:
+            while True:
+                slot = await run_in_threadpool(self._poll_slot, ticket, order, job_id)
+                if slot is not None:
+                    return slot
+                await asyncio.sleep(settings.ADMISSION_POLL_INTERVAL)
+        finally:
+            renewal.cancel()
+            await run_in_threadpool(backend.delete, self._queue_namespace, ticket)
+
+    @asynccontextmanager
+    async def admit(self, priority: int = 0, job_id: Optional[str] = None):
+        # State backend calls block (SQLite locks, Redis round trips), so they run in
+        # worker threads rather than on the event loop
+        ticket = uuid.uuid4().hex
+        slot, queued = await run_in_threadpool(self._try_admit, ticket)
+        if slot is None:
+            if queued >= self.max_queued:
+                raise AdmissionRejected(self.retry_after(queued))
+            slot = await self._wait_for_slot(ticket, priority, job_id)
+
+        renewal = asyncio.create_task(
+            self._renew_lease(self._slots_namespace, slot, {"ticket": ticket})
+        )
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            await run_in_threadpool(
+                get_state_backend().delete, self._slots_namespace, slot
+            )
+            duration = time.monotonic() - started_at
+            self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+
+
+admission_controller = AdmissionController(
+    max_running=settings.MAX_CONCURRENT_JOBS,
+    max_queued=settings.MAX_QUEUED_JOBS,
+)
+fast_admission_controller = AdmissionController(
+    max_running=settings.MAX_CONCURRENT_FAST_JOBS,
+    max_queued=settings.MAX_QUEUED_FAST_JOBS,
+    name="fast_admission",
+)
@@ -0,0 +1,40 @@
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+# Report branches of a job, in report order
+REPORT_TYPES = ("frontend", "ui_ux", "seo")
+
+# PageSpeed Insights categories, with their display names
+PSI_CATEGORIES: Mapping[str, str] = MappingProxyType(
+    {
+        "ACCESSIBILITY": "Accessibility",
+        "BEST_PRACTICES": "Best Practices",
+        "PERFORMANCE": "Performance",
+        "SEO": "SEO",
+    }
+)
+
+# Lighthouse considers audits scoring 0.9 or more as passed. Passed audits are left out
+# of the agents' payload and of the fast reports' issues.
+PASSING_SCORE = 0.9
+
+# Inputs acquired for a job: the Jina AI page formats and the PSI categories
+ACQUIRED_INPUTS = ("html", "text", "screenshot", *PSI_CATEGORIES)
+
+# Acquired inputs the specialist task of each report branch is given the tools of
+BRANCH_TOOL_INPUTS: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+    {
+        "frontend": ("html", "ACCESSIBILITY", "BEST_PRACTICES", "PERFORMANCE"),
+        "ui_ux": ("text", "ACCESSIBILITY", "PERFORMANCE"),
+        "seo": ("text", "SEO", "PERFORMANCE"),
+    }
+)
+
+
+def branch_categories(report_type: str) -> Tuple[str, ...]:
+    """
+    Returns the PSI categories the specialist task of a report branch has the tools of.
+    """
+    return tuple(
+        name for name in BRANCH_TOOL_INPUTS[report_type] if name in PSI_CATEGORIES
+    )
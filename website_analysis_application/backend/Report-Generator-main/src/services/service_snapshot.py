@@ -0,0 +1,170 @@
+import hashlib
+from typing import Dict, List, Optional
+
+import requests
+from src.logger.logger import get_logger
+from src.services.service_crewai.tasks import BRANCH_INPUTS
+from src.services.service_report_types import ACQUIRED_INPUTS, PSI_CATEGORIES
+from src.services.service_state import get_state_backend
+
+logger = get_logger(__file__)
+
+# Jina AI page formats, whose content is compared by hash
+PAGE_FORMATS = ("html", "text", "screenshot")
+
+# Lighthouse scores jitter between runs; smaller moves are not treated as changes.
+PSI_SCORE_TOLERANCE = 0.05
+
+
+def _hash_content(content) -> Optional[str]:
+    """
+    Returns the sha256 of fetched content, or None if the fetch failed.
+    """
+    if not isinstance(content, str):
+        return None
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load_snapshot(url: str) -> Optional[dict]:
+    """
+    Returns the snapshot of the last completed analysis of the URL, if any.
+    """
+    return get_state_backend().get("snapshots", url)
+
+
+def save_snapshot(url: str, snapshot: dict):
+    """
+    Persists the snapshot of a completed analysis.
+    """
+    get_state_backend().set("snapshots", url, snapshot)
+
+
+def fetch_validators(url: str, snapshot: Optional[dict]) -> dict:
+    """
+    Sends a conditional GET for the page using the validators stored in the snapshot.
+
+    Returns:
+        dict: "not_modified" flag plus the "etag" and "last_modified" to store next time.
+    """
+    headers = {}
+    if snapshot and snapshot.get("etag"):
+        headers["If-None-Match"] = snapshot["etag"]
+    if snapshot and snapshot.get("last_modified"):
+        headers["If-Modified-Since"] = snapshot["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=10, stream=True)
+        response.close()
+    except requests.RequestException as e:
+        logger.warning(f"Conditional fetch of {url} failed: {e}")
+        return {"not_modified": False, "etag": None, "last_modified": None}
+
+    not_modified = bool(headers) and response.status_code == 304
+    return {
+        "not_modified": not_modified,
+        "etag": response.headers.get(
+            "ETag", snapshot.get("etag") if not_modified else None
+        ),
+        "last_modified": response.headers.get(
+            "Last-Modified", snapshot.get("last_modified") if not_modified else None
+        ),
+    }
+
+
+def build_snapshot(psi_data: Dict[str, dict], jina_data: Dict[str, object]) -> dict:
+    """
+    Reduces the acquired data to the hashes and audit vectors used for change detection.
+    """
+    audit_vectors = {}
+    for category in PSI_CATEGORIES:
+        category_data = psi_data.get(category, {})
+        if "error" in category_data:
+            audit_vectors[category] = None
+            continue
+        audit_vectors[category] = {
+            "score": category_data.get("score"),
+            "audits": {
+                audit["id"]: audit.get("score")
+                for audit in category_data.get("audits", [])
+            },
+        }
+
+    return {
+        "html_hash": _hash_content(jina_data.get("html")),
+        "text_hash": _hash_content(jina_data.get("text")),
+        "screenshot_hash": _hash_content(jina_data.get("screenshot")),
+        "psi": audit_vectors,
+    }
+
+
+def _score_changed(previous, current) -> bool:
+    if previous is None or current is None:
+        return previous != current
+    return abs(previous - current) > PSI_SCORE_TOLERANCE
+
+
+def _diff_audit_vector(previous: Optional[dict], current: Optional[dict]) -> dict:
+    """
+    Compares the audit vectors of one PSI category.
+    A failed fetch on either side is always reported as a change.
+    """
+    if previous is None or current is None:
+        return {"changed": True, "score": None, "audits": []}
+
+    changed_audits = []
+    for audit_id in sorted(set(previous["audits"]) | set(current["audits"])):
+        before = previous["audits"].get(audit_id)
+        after = current["audits"].get(audit_id)
+        if _score_changed(before, after):
+            changed_audits.append({"id": audit_id, "before": before, "after": after})
+
+    score_changed = _score_changed(previous["score"], current["score"])
+    return {
+        "changed": score_changed or bool(changed_audits),
+        "score": {"before": previous["score"], "after": current["score"]},
+        "audits": changed_audits,
+    }
+
+
+def diff_snapshots(previous: Optional[dict], current: dict) -> dict:
+    """
+    Computes which acquired inputs changed since the previous snapshot and,
+    from that, which report branches need to be generated again.
+    """
+    if previous is None:
+        return {
+            "previous_job_id": None,
+            "changed_inputs": list(ACQUIRED_INPUTS),
+            "psi": {},
+            "rerun": list(BRANCH_INPUTS),
+            "reused": [],
+        }
+
+    changed_inputs: List[str] = []
+    for name in PAGE_FORMATS:
+        key = f"{name}_hash"
+        if current[key] is None or current[key] != previous.get(key):
+            changed_inputs.append(name)
+
+    psi_diff = {}
+    for category in PSI_CATEGORIES:
+        psi_diff[category] = _diff_audit_vector(
+            previous.get("psi", {}).get(category), current["psi"].get(category)
+        )
+        if psi_diff[category]["changed"]:
+            changed_inputs.append(category)
+
+    rerun = [
+        report_type
+        for report_type, inputs in BRANCH_INPUTS.items()
+        if any(name in changed_inputs for name in inputs)
+    ]
+    return {
+        "previous_job_id": previous.get("job_id"),
+        "changed_inputs": changed_inputs,
+        "psi": psi_diff,
+        "rerun": rerun,
+        "reused": [
+            report_type for report_type in BRANCH_INPUTS if report_type not in rerun
+        ],
+    }
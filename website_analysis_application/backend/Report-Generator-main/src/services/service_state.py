@@ -0,0 +1,346 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+from src.config.settings import get_settings
+from src.logger.logger import get_logger
+
+settings = get_settings()
+logger = get_logger(__file__)
+
+
+class StateBackend(ABC):
+    """
+    Key-value store shared by every worker process (and replica) of the API.
+    Values are JSON-serializable dicts grouped by namespace ("jobs", "psi", ...).
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        """
+        Returns the stored value, or None if it is missing or expired.
+        """
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: dict, ttl: Optional[int] = None):
+        """
+        Stores a value, optionally expiring after ttl seconds.
+        """
+
+    @abstractmethod
+    def add(
+        self, namespace: str, key: str, value: dict, ttl: Optional[int] = None
+    ) -> bool:
+        """
+        Stores a value only if the key is absent. Returns whether it was stored.
+        """
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        """
+        Removes a value if present.
+        """
+
+    @abstractmethod
+    def increment(
+        self, namespace: str, key: str, amount: int = 1, ttl: Optional[int] = None
+    ) -> int:
+        """
+        Atomically adds amount to an integer counter (missing counters start at 0),
+        a new counter optionally expiring after ttl seconds. Returns the new value.
+        """
+
+    @abstractmethod
+    def items(self, namespace: str) -> Dict[str, dict]:
+        """
+        Returns the values of a namespace that are not expired, by key.
+        """
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    State backend on a SQLite database in WAL mode.
+    Place the database on a volume shared by the workers (the default for a single host).
+    Expired rows are purged every STATE_PURGE_INTERVAL seconds on writes, and their pages
+    returned to the file system with incremental auto-vacuum.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0.0
+        connection = self._connect()
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Only takes effect on an existing database once it is vacuumed
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("VACUUM")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL, PRIMARY KEY (namespace, key))"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _expires_at(ttl: Optional[int]) -> Optional[float]:
+        return time.time() + ttl if ttl is not None else None
+
+    def purge_expired(self) -> int:
+        """
+        Deletes the expired rows and frees their pages. Returns the number of rows deleted.
+        """
+        connection = self._connect()
+        cursor = connection.execute(
+            "DELETE FROM state WHERE expires_at <= ?", (time.time(),)
+        )
+        # Frees one page per step, which executescript runs to completion
+        connection.executescript("PRAGMA incremental_vacuum;")
+        return cursor.rowcount
+
+    def _purge_if_due(self):
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + settings.STATE_PURGE_INTERVAL
+        try:
+            deleted = self.purge_expired()
+        except sqlite3.Error as e:
+            logger.warning(f"Purging expired state failed: {e}")
+            return
+        if deleted:
+            logger.info(f"Purged {deleted} expired state entries")
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: dict, ttl: Optional[int] = None):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), self._expires_at(ttl)),
+        )
+        self._purge_if_due()
+
+    def add(
+        self, namespace: str, key: str, value: dict, ttl: Optional[int] = None
+    ) -> bool:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (namespace, key, time.time()),
+            )
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO state (namespace, key, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), self._expires_at(ttl)),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str):
+        self._connect().execute(
+            "DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def increment(
+        self, namespace: str, key: str, amount: int = 1, ttl: Optional[int] = None
+    ) -> int:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            expires_at = row[1] if row else self._expires_at(ttl)
+            connection.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+
+    def items(self, namespace: str) -> Dict[str, dict]:
+        rows = (
+            self._connect()
+            .execute(
+                "SELECT key, value FROM state WHERE namespace = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, time.time()),
+            )
+            .fetchall()
+        )
+        return {key: json.loads(value) for key, value in rows}
+
+
+class RedisStateBackend(StateBackend):
+    """
+    State backend speaking the Redis protocol, for deployments spanning several hosts.
+    Each namespace keeps a sorted set of its keys scored by expiry, so its values are
+    listed without scanning the keyspace; entries of expired keys are dropped on writes.
+    Any server implementing GET/MGET/SET (with EX and NX)/DEL/INCRBY/EXPIRE and
+    ZADD/ZREM/ZRANGEBYSCORE/ZREMRANGEBYSCORE works.
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"{namespace}:{key}"
+
+    @staticmethod
+    def _index(namespace: str) -> str:
+        return f"{namespace}#keys"
+
+    def _index_key(self, pipeline, namespace: str, key: str, ttl: Optional[int]):
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else "+inf"
+        pipeline.zadd(self._index(namespace), {key: expires_at})
+        pipeline.zremrangebyscore(self._index(namespace), "-inf", now)
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        raw = self.client.get(self._key(namespace, key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, namespace: str, key: str, value: dict, ttl: Optional[int] = None):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(self._key(namespace, key), json.dumps(value), ex=ttl)
+        self._index_key(pipeline, namespace, key, ttl)
+        pipeline.execute()
+
+    def add(
+        self, namespace: str, key: str, value: dict, ttl: Optional[int] = None
+    ) -> bool:
+        added = self.client.set(
+            self._key(namespace, key), json.dumps(value), ex=ttl, nx=True
+        )
+        if added:
+            pipeline = self.client.pipeline(transaction=False)
+            self._index_key(pipeline, namespace, key, ttl)
+            pipeline.execute()
+        return bool(added)
+
+    def delete(self, namespace: str, key: str):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.delete(self._key(namespace, key))
+        pipeline.zrem(self._index(namespace), key)
+        pipeline.execute()
+
+    def increment(
+        self, namespace: str, key: str, amount: int = 1, ttl: Optional[int] = None
+    ) -> int:
+        value = self.client.incrby(self._key(namespace, key), amount)
+        if value == amount:
+            # Only the increment creating the counter sets its expiry
+            pipeline = self.client.pipeline(transaction=False)
+            if ttl is not None:
+                pipeline.expire(self._key(namespace, key), ttl)
+            self._index_key(pipeline, namespace, key, ttl)
+            pipeline.execute()
+        return value
+
+    def items(self, namespace: str) -> Dict[str, dict]:
+        keys = [
+            key.decode()
+            for key in self.client.zrangebyscore(
+                self._index(namespace), time.time(), "+inf"
+            )
+        ]
+        if not keys:
+            return {}
+        raws = self.client.mget([self._key(namespace, key) for key in keys])
+        return {key: json.loads(raw) for key, raw in zip(keys, raws) if raw is not None}
+
+
+@lru_cache(maxsize=None)
+def get_state_backend() -> StateBackend:
+    """Function to get and cache the state backend selected in the settings."""
+    if settings.STATE_BACKEND == "sqlite":
+        return SQLiteStateBackend(settings.STATE_SQLITE_PATH)
+    elif settings.STATE_BACKEND == "redis":
+        return RedisStateBackend(settings.REDIS_URL)
+    else:
+        raise ValueError(f"Invalid state backend: {settings.STATE_BACKEND}")
+
+
+def get_or_fetch(
+    namespace: str,
+    key: str,
+    fetch: Callable[[], dict],
+    ttl: Optional[int] = None,
+    should_cache: Callable[[dict], bool] = lambda value: True,
+    lock_timeout: int = 120,
+    poll_interval: float = 0.5,
+) -> dict:
+    """
+    Returns the cached value, or fetches and caches it.
+    A lock key makes a single worker fetch while the others wait for its result,
+    so concurrent jobs on the same URL do not duplicate upstream calls.
+    """
+    backend = get_state_backend()
+    cached = backend.get(namespace, key)
+    if cached is not None:
+        return cached
+
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + lock_timeout
+    locked = backend.add(namespace, lock_key, {"pid": os.getpid()}, ttl=lock_timeout)
+    while not locked and time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        cached = backend.get(namespace, key)
+        if cached is not None:
+            return cached
+        locked = backend.add(
+            namespace, lock_key, {"pid": os.getpid()}, ttl=lock_timeout
+        )
+
+    try:
+        value = fetch()
+        if should_cache(value):
+            backend.set(namespace, key, value, ttl)
+        return value
+    finally:
+        if locked:
+            backend.delete(namespace, lock_key)
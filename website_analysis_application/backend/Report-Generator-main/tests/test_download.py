@@ -0,0 +1,152 @@
+import io
+import os
+import zipfile
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from src.services.service_download import (
+    BundleMemberChanged,
+    build_report_response,
+    get_content_etag,
+    is_not_modified,
+    iter_zip_stream,
+)
+from starlette.datastructures import Headers
+
+REPORT = b"%PDF-report" * 100
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(REPORT)
+    stat_result = os.stat(path)
+    return str(path), stat_result, get_content_etag(str(path), stat_result)
+
+
+@pytest.fixture
+def client(report):
+    path, stat_result, etag = report
+    app = FastAPI()
+
+    @app.get("/report")
+    async def download(request: Request):
+        return build_report_response(
+            request.headers, path, "report.pdf", stat_result, etag
+        )
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "if_none_match, not_modified",
+    [
+        ("{etag}", True),
+        ("W/{etag}", True),
+        ('"other", {etag}', True),
+        ("*", True),
+        ('"other"', False),
+    ],
+)
+def test_evaluates_if_none_match(report, if_none_match, not_modified):
+    _, stat_result, etag = report
+    headers = Headers({"if-none-match": if_none_match.format(etag=etag)})
+
+    assert is_not_modified(headers, etag, stat_result) is not_modified
+
+
+def test_evaluates_if_modified_since(report):
+    _, stat_result, etag = report
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    earlier = formatdate(stat_result.st_mtime - 60, usegmt=True)
+
+    assert is_not_modified(
+        Headers({"if-modified-since": last_modified}), etag, stat_result
+    )
+    assert not is_not_modified(
+        Headers({"if-modified-since": earlier}), etag, stat_result
+    )
+    assert not is_not_modified(
+        Headers({"if-modified-since": "not a date"}), etag, stat_result
+    )
+    # If-None-Match takes precedence over If-Modified-Since
+    assert not is_not_modified(
+        Headers({"if-none-match": '"other"', "if-modified-since": last_modified}),
+        etag,
+        stat_result,
+    )
+
+
+def test_answers_a_weak_etag_with_304(client, report):
+    _, _, etag = report
+
+    response = client.get("/report", headers={"If-None-Match": f"W/{etag}"})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+@pytest.mark.parametrize(
+    "if_range, status_code",
+    [("{etag}", 206), ("{last_modified}", 206), ('"other"', 200)],
+)
+def test_serves_the_range_only_when_if_range_matches(
+    client, report, if_range, status_code
+):
+    _, stat_result, etag = report
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+    response = client.get(
+        "/report",
+        headers={
+            "Range": "bytes=0-9",
+            "If-Range": if_range.format(etag=etag, last_modified=last_modified),
+        },
+    )
+
+    assert response.status_code == status_code
+    assert response.content == (REPORT[:10] if status_code == 206 else REPORT)
+
+
+@pytest.fixture
+def members(tmp_path):
+    contents = {
+        "frontend_report.pdf": b"%PDF-frontend" * 1000,
+        "ui_ux_report.pdf": b"",
+        "seo_report.pdf": bytes(range(256)) * 10,
+    }
+    pairs = []
+    for arcname, data in contents.items():
+        path = tmp_path / arcname
+        path.write_bytes(data)
+        pairs.append((arcname, str(path)))
+    return pairs, contents
+
+
+def test_streams_a_valid_archive(members):
+    pairs, contents = members
+
+    data = b"".join(iter_zip_stream(pairs, chunk_size=100))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(contents)
+        for info in archive.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.file_size == len(contents[info.filename])
+            assert archive.read(info) == contents[info.filename]
+
+
+def test_fails_when_a_member_grows_while_being_zipped(members):
+    pairs, _ = members
+    stream = iter_zip_stream(pairs, chunk_size=100)
+
+    next(stream)
+    with open(pairs[0][1], "ab") as source:
+        source.write(b"appended")
+
+    with pytest.raises(BundleMemberChanged):
+        b"".join(stream)
@@ -0,0 +1,35 @@
+import pytest
+from src.services.service_crewai.html_cleaner import StreamingHTMLCleaner
+
+
+def clean(html: str, chunk_size: int = 3) -> str:
+    cleaner = StreamingHTMLCleaner()
+    for start in range(0, len(html), chunk_size):
+        cleaner.feed(html[start : start + chunk_size])
+    cleaner.close()
+    return cleaner.get_cleaned_html()
+
+
+@pytest.mark.parametrize(
+    "html, cleaned",
+    [
+        ("<div><div>a</div></div>", "<div>a</div>"),
+        ("<div><div><div>a</div></div></div>", "<div>a</div>"),
+        ("<div><div>a</div>b</div>", "<div><div>a</div>b</div>"),
+        ("<div><div>a</div><div>b</div></div>", "<div><div>a</div><div>b</div></div>"),
+        ("<div><div><div>a</div>b</div></div>", "<div><div>a</div>b</div>"),
+        ("<span><span>x</span><br/></span>", "<span><span>x</span></span>"),
+    ],
+)
+def test_merges_an_element_only_into_its_only_child_of_the_same_name(html, cleaned):
+    assert clean(html) == cleaned
+
+
+def test_removes_scripts_comments_attributes_and_empty_elements():
+    html = (
+        '<div class="x"><div id="y"><p>p &amp; q</p></div>'
+        "<script>x()</script><!-- note --><span></span></div>"
+    )
+
+    # The empty span is dropped, but still keeps the inner div from being merged
+    assert clean(html) == "<div><div><p>p &amp; q</p></div></div>"
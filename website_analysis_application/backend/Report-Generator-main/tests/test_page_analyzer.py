@@ -0,0 +1,154 @@
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from PIL import Image
+from src.services.service_crewai.page_analyzer import (
+    IMAGE_HEADER_BYTES,
+    LocalPageAnalyzer,
+    settings,
+)
+from src.services.service_memory import MemoryAccount, current_memory_account
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Fixture page</title>
+<link rel="stylesheet" href="/style.css">
+<script src="/app.js"></script>
+<script src="/deferred.js" defer></script>
+</head>
+<body>
+<img src="/large.png" width="100" height="100" alt="Large">
+<img src="/small.png">
+</body>
+</html>
+"""
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def site(tmp_path_factory):
+    """
+    Serves a static page with a stylesheet, scripts and images on a local server.
+    """
+    root = tmp_path_factory.mktemp("site")
+    (root / "index.html").write_text(INDEX_HTML)
+    (root / "style.css").write_text("body { margin: 0; }\n" * 200)
+    (root / "app.js").write_text("console.log('app');\n")
+    (root / "deferred.js").write_text("console.log('deferred');\n")
+    # Noisy pixels keep the PNG larger than the header bytes the analyzer reads
+    Image.frombytes("RGB", (2000, 1000), os.urandom(2000 * 1000 * 3)).save(
+        root / "large.png"
+    )
+    Image.new("RGB", (10, 10)).save(root / "small.png")
+
+    handler = functools.partial(QuietHandler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def analysis(site):
+    _, base_url = site
+    return LocalPageAnalyzer(f"{base_url}/index.html").analyze()
+
+
+def _audit(analysis, category, audit_id):
+    return next(
+        audit for audit in analysis[category]["audits"] if audit["id"] == audit_id
+    )
+
+
+def test_returns_every_category_in_the_psi_shape(site, analysis):
+    _, base_url = site
+    assert set(analysis) == {"ACCESSIBILITY", "BEST_PRACTICES", "PERFORMANCE", "SEO"}
+    for category_data in analysis.values():
+        assert category_data["source"] == "local"
+        assert category_data["final_url"] == f"{base_url}/index.html"
+        assert 0 <= category_data["score"] <= 1
+        assert all(
+            "id" in audit and "score" in audit for audit in category_data["audits"]
+        )
+
+
+def test_finds_render_blocking_resources(site, analysis):
+    _, base_url = site
+    audit = _audit(analysis, "PERFORMANCE", "render-blocking-resources")
+    assert audit["score"] == 0
+    assert {item["url"] for item in audit["details"]} == {
+        f"{base_url}/style.css",
+        f"{base_url}/app.js",
+    }
+
+
+def test_measures_transfer_sizes_and_headers(site, analysis):
+    root, base_url = site
+    summary = _audit(analysis, "PERFORMANCE", "resource-summary")["details"]
+    by_type = {entry["resourceType"]: entry for entry in summary}
+    assert by_type["script"]["count"] == 2
+    assert by_type["image"]["transferSize"] == sum(
+        (root / name).stat().st_size for name in ("large.png", "small.png")
+    )
+
+    compression = _audit(analysis, "PERFORMANCE", "uses-text-compression")
+    assert f"{base_url}/style.css" in {item["url"] for item in compression["details"]}
+
+    cache = _audit(analysis, "PERFORMANCE", "uses-long-cache-ttl")
+    assert cache["score"] == 0
+
+
+def test_reads_image_dimensions_from_the_header_bytes(site, analysis):
+    root, base_url = site
+    assert (root / "large.png").stat().st_size > IMAGE_HEADER_BYTES
+    audit = _audit(analysis, "PERFORMANCE", "uses-responsive-images")
+    assert audit["details"] == [
+        {
+            "url": f"{base_url}/large.png",
+            "intrinsicSize": "2000x1000",
+            "declaredWidth": 100,
+        }
+    ]
+    assert _audit(analysis, "PERFORMANCE", "unsized-images")["details"] == [
+        {"src": "/small.png"}
+    ]
+
+
+def test_checks_document_level_audits(analysis):
+    assert _audit(analysis, "ACCESSIBILITY", "image-alt")["score"] == 0
+    assert _audit(analysis, "ACCESSIBILITY", "html-has-lang")["score"] == 0
+    assert _audit(analysis, "ACCESSIBILITY", "document-title")["score"] == 1
+    assert _audit(analysis, "BEST_PRACTICES", "doctype")["score"] == 1
+    assert _audit(analysis, "BEST_PRACTICES", "charset")["score"] == 1
+    assert _audit(analysis, "BEST_PRACTICES", "is-on-https")["score"] == 0
+    assert _audit(analysis, "SEO", "http-status-code")["score"] == 1
+    assert _audit(analysis, "SEO", "meta-description")["score"] == 0
+    assert _audit(analysis, "SEO", "viewport")["score"] == 0
+
+
+def test_reads_the_page_up_to_the_byte_limit(site, monkeypatch):
+    _, base_url = site
+    monkeypatch.setattr(settings, "JINA_MAX_BYTES", 100)
+    account = MemoryAccount()
+    token = current_memory_account.set(account)
+    try:
+        with httpx.Client() as client:
+            _, html = LocalPageAnalyzer(f"{base_url}/index.html")._fetch_document(
+                client
+            )
+    finally:
+        current_memory_account.reset(token)
+    assert html == INDEX_HTML[:100]
+    assert account.truncated == ["analyzer"]
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from src.services import service_cancel, service_rate_limit
+from src.services.service_cancel import JobCancelled, cancel_job
+from src.services.service_rate_limit import (
+    AdmissionController,
+    AdmissionRejected,
+    settings,
+)
+from src.services.service_state import SQLiteStateBackend
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = SQLiteStateBackend(str(tmp_path / "state.db"))
+    for module in (service_cancel, service_rate_limit):
+        monkeypatch.setattr(module, "get_state_backend", lambda: backend)
+    monkeypatch.setattr(settings, "ADMISSION_POLL_INTERVAL", 0.01)
+    return backend
+
+
+def test_a_cancelled_job_leaves_the_queue(backend):
+    controller = AdmissionController(max_running=1, max_queued=1)
+
+    async def run():
+        async with controller.admit(job_id="running"):
+            waiting = asyncio.create_task(
+                controller.admit(job_id="queued").__aenter__()
+            )
+            await asyncio.sleep(0.05)
+            assert len(backend.items("admission_queue")) == 1
+
+            cancel_job("queued", "cancel_requested")
+            with pytest.raises(JobCancelled):
+                await asyncio.wait_for(waiting, timeout=1)
+            assert backend.items("admission_queue") == {}
+
+    asyncio.run(run())
+
+
+def test_controllers_admit_their_jobs_apart(backend):
+    controller = AdmissionController(max_running=1, max_queued=0)
+    fast_controller = AdmissionController(
+        max_running=1, max_queued=0, name="fast_admission"
+    )
+
+    async def run():
+        async with controller.admit():
+            async with fast_controller.admit():
+                assert list(backend.items("fast_admission_slots")) == ["0"]
+                with pytest.raises(AdmissionRejected):
+                    async with fast_controller.admit():
+                        pass
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+from contextvars import copy_context
+from types import SimpleNamespace
+
+from src.services.service_crewai.shared_context import (
+    MIN_CACHED_PREFIX_CHARS,
+    TokenUsage,
+    build_shared_contexts,
+    current_token_usage,
+    warm_up_prefix,
+)
+
+PSI_DATA = {
+    category: {"score": 0.5, "audits": []}
+    for category in ("ACCESSIBILITY", "BEST_PRACTICES", "PERFORMANCE", "SEO")
+}
+JINA_DATA = {"html": "<p>page</p>", "screenshot": "https://shot/1.png"}
+
+
+def test_gives_each_specialist_only_the_inputs_it_uses():
+    contexts = build_shared_contexts("https://example.com", PSI_DATA, JINA_DATA)
+
+    assert "Cleaned HTML" in contexts["frontend_specialist_Agent"]
+    assert "Cleaned HTML" not in contexts["ui_ux_specialist_Agent"]
+    assert "PageSpeed Insights SEO" in contexts["seo_specialist_Agent"]
+    assert "PageSpeed Insights SEO" not in contexts["frontend_specialist_Agent"]
+    assert "Page Screenshot" in contexts["image_analysis_Agent"]
+    assert "PageSpeed" not in contexts["image_analysis_Agent"]
+    # Sections keep one order, so the UI/UX context starts the frontend one
+    ui_ux = contexts["ui_ux_specialist_Agent"].removesuffix("\n---\n")
+    assert contexts["frontend_specialist_Agent"].startswith(ui_ux)
+
+
+def test_warms_up_the_longest_prefix_shared_by_two_contexts():
+    common = "x" * MIN_CACHED_PREFIX_CHARS
+
+    assert warm_up_prefix([common + "ab", common + "ac", "y"]) == common + "a"
+    assert warm_up_prefix([common[1:] + "a", common[1:] + "b"]) is None
+    assert warm_up_prefix([common]) is None
+
+
+def test_adds_the_usage_of_each_response_to_the_current_job_only():
+    usage = SimpleNamespace(
+        prompt_tokens=100,
+        completion_tokens=10,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=80),
+    )
+    job_usage, other_job_usage = TokenUsage(), TokenUsage()
+
+    def request(token_usage):
+        current_token_usage.set(token_usage)
+        copy_context().run(lambda: current_token_usage.get().add(usage))
+
+    copy_context().run(request, job_usage)
+    copy_context().run(request, job_usage)
+    copy_context().run(request, other_job_usage)
+    job_usage.add(None)
+
+    assert job_usage.summary() == {
+        "prompt_tokens": 200,
+        "cached_prompt_tokens": 160,
+        "completion_tokens": 20,
+        "successful_requests": 2,
+        "cache_hit_rate": 0.8,
+    }
+    assert other_job_usage.summary()["prompt_tokens"] == 100
@@ -0,0 +1,66 @@
+from src.services.service_crewai.tasks import BRANCH_INPUTS
+from src.services.service_report_types import ACQUIRED_INPUTS, REPORT_TYPES
+from src.services.service_snapshot import build_snapshot, diff_snapshots
+
+PSI_DATA = {
+    category: {"score": 0.8, "audits": [{"id": "audit", "score": 0.5}]}
+    for category in ("ACCESSIBILITY", "BEST_PRACTICES", "PERFORMANCE", "SEO")
+}
+JINA_DATA = {"html": "<p>a</p>", "text": "a", "screenshot": "https://shot/1.png"}
+
+
+def snapshot(psi_data=PSI_DATA, jina_data=JINA_DATA, job_id="previous"):
+    return {**build_snapshot(psi_data, jina_data), "job_id": job_id}
+
+
+def test_reruns_every_branch_without_a_previous_snapshot():
+    diff = diff_snapshots(None, snapshot())
+
+    assert diff["changed_inputs"] == list(ACQUIRED_INPUTS)
+    assert diff["rerun"] == list(REPORT_TYPES)
+    assert diff["reused"] == []
+
+
+def test_reuses_every_branch_when_nothing_changed():
+    current = {**snapshot(), "job_id": None}
+    # Score moves within the tolerance are jitter, not changes
+    current["psi"]["SEO"]["score"] = 0.83
+
+    diff = diff_snapshots(snapshot(), current)
+
+    assert diff["previous_job_id"] == "previous"
+    assert diff["changed_inputs"] == []
+    assert diff["rerun"] == []
+    assert diff["reused"] == list(REPORT_TYPES)
+
+
+def test_reruns_the_branches_whose_prompts_include_a_changed_input():
+    diff = diff_snapshots(snapshot(), snapshot(jina_data={**JINA_DATA, "text": "b"}))
+
+    # Only the UI/UX and SEO specialists search the page text
+    assert diff["changed_inputs"] == ["text"]
+    assert diff["rerun"] == ["ui_ux", "seo"]
+    assert diff["reused"] == ["frontend"]
+
+
+def test_reports_the_changed_audits():
+    psi_data = {**PSI_DATA, "SEO": {"score": 0.8, "audits": [{"id": "audit"}]}}
+
+    diff = diff_snapshots(snapshot(), snapshot(psi_data))
+
+    assert diff["changed_inputs"] == ["SEO"]
+    assert diff["psi"]["SEO"]["audits"] == [
+        {"id": "audit", "before": 0.5, "after": None}
+    ]
+    assert diff["rerun"] == [
+        report_type for report_type, inputs in BRANCH_INPUTS.items() if "SEO" in inputs
+    ]
+
+
+def test_treats_a_failed_fetch_as_a_change():
+    psi_data = {**PSI_DATA, "PERFORMANCE": {"error": "timeout"}}
+
+    diff = diff_snapshots(snapshot(), snapshot(psi_data, {**JINA_DATA, "html": None}))
+
+    assert diff["changed_inputs"] == ["html", "PERFORMANCE"]
+    assert diff["rerun"] == list(REPORT_TYPES)
@@ -2,13 +2,14 @@ interface ReportSectionProps {
   title: string;
   content: string;
   downloadType: string;
+  downloadUrl: string;
 }
 
-export function ReportSection({ title, content, downloadType }: ReportSectionProps) {
+export function ReportSection({ title, content, downloadType, downloadUrl }: ReportSectionProps) {
   const handleDownload = async () => {
     const baseUrl = process.env.NEXT_PUBLIC_API_BASE_URL;
     try {
-      const response = await fetch(`${baseUrl}/generator/download-report?type=${downloadType}`, {
+      const response = await fetch(`${baseUrl}${downloadUrl}`, {
         method: "GET",
       });
 
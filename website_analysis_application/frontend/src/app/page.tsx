@@ -8,6 +8,8 @@ export default function Home() {
   const [url, setUrl] = useState('')
   const [isAnalyzing, setIsAnalyzing] = useState(false)
   const [showReports, setShowReports] = useState(false)
+  const [reportUrls, setReportUrls] = useState({ frontend: '', ui_ux: '', seo: '' })
+  const [bundleUrl, setBundleUrl] = useState('')
 
   const handleSubmit = async (submittedUrl: string) => {
     setUrl(submittedUrl);
@@ -23,16 +25,24 @@ export default function Home() {
         body: JSON.stringify({ url: submittedUrl }),
       });
   
+      if (response.status === 429) {
+        const retryAfter = response.headers.get("Retry-After");
+        alert(`The server is busy. Please try again in ${retryAfter ?? "a few"} seconds.`);
+        return;
+      }
+
       if (!response.ok) {
         throw new Error("Report generation failed");
       }
   
-      const { frontend_report_url, ui_ux_report_url, seo_report_url } = await response.json();
+      const { frontend_report_url, ui_ux_report_url, seo_report_url, bundle_url } = await response.json();
   
       console.log("Frontend Report URL:", frontend_report_url);
       console.log("UI/UX Report URL:", ui_ux_report_url);
       console.log("SEO Report URL:", seo_report_url);
   
+      setReportUrls({ frontend: frontend_report_url, ui_ux: ui_ux_report_url, seo: seo_report_url });
+      setBundleUrl(bundle_url);
       setShowReports(true);
     } catch (error) {
       console.error("Error:", error);
@@ -55,20 +65,31 @@ export default function Home() {
       )}
       {showReports && (
         <div className="mt-12 space-y-8">
+          <div className="text-center">
+            <a
+              href={`${process.env.NEXT_PUBLIC_API_BASE_URL}${bundleUrl}`}
+              className="inline-block px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-blue-500"
+            >
+              Download All Reports (ZIP)
+            </a>
+          </div>
           <ReportSection
             title="Front-end Analysis"
             content="Technical aspects of the website..."
             downloadType="frontend"
+            downloadUrl={reportUrls.frontend}
           />
           <ReportSection
             title="UI/UX Analysis"
             content="Design and user experience evaluation..."
             downloadType="ui_ux"
+            downloadUrl={reportUrls.ui_ux}
           />
           <ReportSection
             title="SEO Analysis"
             content="Search engine optimization insights..."
             downloadType="seo"
+            downloadUrl={reportUrls.seo}
           />
         </div>
       )}